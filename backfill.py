@@ -0,0 +1,258 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram import Bot
+
+import homework
+from cursor import parse_date, parse_moment
+from exceptions import UnknownStatusError
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_WINDOW = 60 * 60
+BACKFILL_RATE = 1.0
+BACKFILL_WORKERS = 4
+CHECKPOINT_FILE = 'backfill.checkpoint.json'
+STATE_FILE = 'backfill_state.idx'
+
+
+class RateLimiter:
+    """Общий для всех потоков лимит запросов в секунду.
+
+    Каждый вызов acquire() резервирует ближайший свободный слот и
+    спит до него вне блокировки, так что потоки не ждут друг друга
+    дольше, чем требует лимит.
+    """
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1 / rate
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.next_slot = 0
+
+    def acquire(self):
+        """Ждём своей очереди на запрос."""
+        with self.lock:
+            now = self.clock()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            self.sleep(slot - now)
+
+
+class Checkpoint:
+    """Для каждого tenant - начало прогона и конец обработанного окна.
+
+    Позиция действует только для прогона с тем же since и удаляется,
+    когда прогон tenant завершён, поэтому следующий простой
+    догружается с указанного since, а не с позиции прошлого прогона.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.positions = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                self.positions = json.load(file)
+
+    def get(self, tenant, since):
+        """Возвращаем позицию прерванного прогона от since или since."""
+        saved = self.positions.get(tenant)
+        if saved is None or saved['since'] != since:
+            return since
+        return saved['position']
+
+    def save(self, tenant, since, position):
+        """Атомарно сохраняем позицию прогона tenant."""
+        with self.lock:
+            self.positions[tenant] = {'since': since, 'position': position}
+            self.write()
+
+    def clear(self, tenant):
+        """Удаляем позицию завершённого прогона tenant."""
+        with self.lock:
+            if self.positions.pop(tenant, None) is not None:
+                self.write()
+
+    def write(self):
+        """Записываем позиции через временный файл."""
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(self.positions, file)
+        os.replace(temporary, self.path)
+
+
+class Backfill:
+    """Догоняем изменения статусов за прошедший период.
+
+    API отдаёт текущее состояние работ, обновлённых после from_date,
+    без верхней границы, поэтому по каждому токену делается один
+    запрос от позиции в checkpoint, а окна window нарезаются уже по
+    date_updated. После каждого окна сохраняются индекс и позиция,
+    прерванный прогон с тем же since продолжается с последнего окна.
+    Переходы, которые уже есть в HomeworkIndex, считаются
+    доставленными и пропускаются. В индекс переход записывается только
+    после успешной отправки, поэтому без notifier или при ошибке
+    отправки он будет доставлен повторным прогоном или ботом.
+    """
+
+    def __init__(self, index, limiter, checkpoint, window=BACKFILL_WINDOW,
+                 notifier=None, output=sys.stdout, state_file=None):
+        self.index = index
+        self.state_file = state_file
+        self.limiter = limiter
+        self.checkpoint = checkpoint
+        self.window = window
+        self.notifier = notifier
+        self.output = output
+        self.lock = threading.Lock()
+        self.emitted = 0
+        self.suppressed = 0
+
+    def run(self, fetchers, since, until, workers=BACKFILL_WORKERS):
+        """Обрабатываем все tenant параллельно."""
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                tenant: executor.submit(
+                    self.backfill_tenant, tenant, fetch, since, until
+                )
+                for tenant, fetch in fetchers.items()
+            }
+        failed = []
+        for tenant, future in futures.items():
+            error = future.exception()
+            if error is not None:
+                logger.error(f'backfill of {tenant} failed: {error}')
+                failed.append(tenant)
+        return failed
+
+    def backfill_tenant(self, tenant, fetch, since, until):
+        """Проходим окна одного tenant по порядку."""
+        start = self.checkpoint.get(tenant, since)
+        if start >= until:
+            self.checkpoint.clear(tenant)
+            return
+        self.limiter.acquire()
+        response = fetch(start)
+        homework.check_response(response)
+        items = sorted(
+            (
+                (parse_date(item['date_updated']), item)
+                for item in response['homeworks']
+                if item.get('date_updated')
+            ),
+            key=lambda pair: pair[0]
+        )
+        position = 0
+        while start < until:
+            end = min(start + self.window, until)
+            while position < len(items) and items[position][0] < end:
+                timestamp, item = items[position]
+                if timestamp >= start:
+                    self.emit(tenant, item)
+                position += 1
+            self.save(tenant, since, end)
+            start = end
+        self.checkpoint.clear(tenant)
+
+    def save(self, tenant, since, position):
+        """Сохраняем состояние работ, затем позицию tenant.
+
+        Индекс пишется первым: если прогон прервётся между записями,
+        повтор окна будет подавлен индексом, а не отправлен заново.
+        """
+        with self.lock:
+            if self.state_file is not None:
+                homework.save_index(self.index, self.state_file)
+            self.checkpoint.save(tenant, since, position)
+
+    def emit(self, tenant, item):
+        """Выводим переход и отправляем уведомление, если оно новое."""
+        try:
+            message = homework.parse_status(item)
+        except UnknownStatusError:
+            message = homework.describe_unknown_status(item)
+        if not self.index.changed(item):
+            with self.lock:
+                self.suppressed += 1
+            return
+        with self.lock:
+            self.emitted += 1
+            print(f'{item["date_updated"]} {tenant} {message}',
+                  file=self.output)
+        if self.notifier is None:
+            return
+        results = self.notifier.deliver([message])
+        if not results[self.notifier.primary]:
+            logger.error(f"Can't send a backfilled message: {message}")
+            return
+        self.index.update(item)
+
+
+def load_state(path, seed=homework.STATE_FILE):
+    """Читаем собственный индекс backfill или копию состояния бота.
+
+    Файл бота только читается: он записывается через тот же .tmp,
+    и два процесса, пишущие его без блокировки, затирают друг друга.
+    """
+    if os.path.exists(path):
+        return homework.load_index(path)
+    return homework.load_index(seed)
+
+
+def main(argv=None):
+    """Запускаем догрузку пропущенных статусов из командной строки."""
+    parser = argparse.ArgumentParser(
+        description='Replay homework statuses after an outage'
+    )
+    parser.add_argument('since', type=parse_moment,
+                        help='timestamp or ISO date to start from')
+    parser.add_argument('--until', type=parse_moment, default=None)
+    parser.add_argument('--window', type=int, default=BACKFILL_WINDOW)
+    parser.add_argument('--rate', type=float, default=BACKFILL_RATE,
+                        help='API requests per second for all tokens')
+    parser.add_argument('--workers', type=int, default=BACKFILL_WORKERS)
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE)
+    parser.add_argument('--state', default=STATE_FILE,
+                        help='index file of backfill, not the bot one')
+    parser.add_argument('--notify', action='store_true',
+                        help='send new transitions to Telegram')
+    args = parser.parse_args(argv)
+    if os.path.abspath(args.state) == os.path.abspath(homework.STATE_FILE):
+        parser.error('--state must not be the state file of the bot')
+    credentials = homework.load_credentials()
+    fetchers = {
+        tenant: homework.TenantFetcher(credentials, tenant)
+        for tenant in credentials.tenants
+    }
+    index = load_state(args.state)
+    backfill = Backfill(
+        index,
+        RateLimiter(args.rate),
+        Checkpoint(args.checkpoint),
+        args.window,
+        homework.build_notifier(Bot(token=homework.TELEGRAM_TOKEN))
+        if args.notify else None,
+        state_file=args.state
+    )
+    failed = backfill.run(
+        fetchers, args.since, args.until or int(time.time()), args.workers
+    )
+    logger.info(
+        f'backfill emitted {backfill.emitted}, '
+        f'suppressed {backfill.suppressed}, failed {failed}'
+    )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import sys
+
+from cryptography.fernet import Fernet, InvalidToken
+
+DEFAULT_TENANT = 'default'
+
+
+def encrypt_tokens(tokens, key):
+    """Шифруем словарь {tenant: token} ключом Fernet."""
+    data = json.dumps(tokens).encode('utf-8')
+    return Fernet(key).encrypt(data)
+
+
+def decrypt_tokens(data, key):
+    """Расшифровываем словарь {tenant: token}."""
+    try:
+        tokens = json.loads(Fernet(key).decrypt(data))
+    except InvalidToken:
+        raise ValueError('credentials file can not be decrypted with the key')
+    if not isinstance(tokens, dict):
+        raise TypeError(
+            f'type of credentials is not a dict, but {type(tokens)}'
+        )
+    return tokens
+
+
+class CredentialProvider:
+    """Токены Практикума для многих пользователей (tenant).
+
+    Токены читаются из зашифрованного файла, заголовки Authorization
+    для каждого tenant собираются один раз и кешируются. refresh()
+    перечитывает файл только если он изменился, так что токены можно
+    менять без перезапуска. Токен, на который API ответил 401,
+    помечается недействительным до тех пор, пока его не заменят.
+    """
+
+    def __init__(self, path=None, key=None, tokens=None):
+        self.path = path
+        self.key = key
+        self.static_tokens = dict(tokens or {})
+        self.tokens = {}
+        self.cached_headers = {}
+        self.invalid = set()
+        self.mtime = None
+        self.update(self.static_tokens)
+        self.refresh()
+
+    def refresh(self):
+        """Перечитываем файл токенов, если он изменился на диске."""
+        if not self.path:
+            return False
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self.mtime:
+            return False
+        with open(self.path, 'rb') as file:
+            tokens = decrypt_tokens(file.read(), self.key)
+        self.mtime = mtime
+        self.update({**self.static_tokens, **tokens})
+        return True
+
+    def update(self, tokens):
+        """Применяем новый набор токенов, сохраняя неизменённые заголовки."""
+        for tenant in set(self.tokens) - set(tokens):
+            del self.cached_headers[tenant]
+            self.invalid.discard(tenant)
+        for tenant, token in tokens.items():
+            if self.tokens.get(tenant) == token:
+                continue
+            self.cached_headers[tenant] = {'Authorization': f'OAuth {token}'}
+            self.invalid.discard(tenant)
+        self.tokens = dict(tokens)
+
+    def headers(self, tenant):
+        """Возвращаем закешированные заголовки для tenant."""
+        return self.cached_headers[tenant]
+
+    def invalidate(self, tenant):
+        """Помечаем токен tenant недействительным."""
+        self.invalid.add(tenant)
+
+    def is_active(self, tenant):
+        """Проверяем, что токен tenant есть и не отозван."""
+        return tenant in self.tokens and tenant not in self.invalid
+
+    @property
+    def tenants(self):
+        """Список tenant с действующими токенами."""
+        return [tenant for tenant in self.tokens if tenant not in self.invalid]
+
+
+def main(argv=None):
+    """Создаём ключ или шифруем JSON-файл с токенами."""
+    parser = argparse.ArgumentParser(description='Practicum tokens storage')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('keygen', help='print a new CREDENTIALS_KEY')
+    encrypt = commands.add_parser(
+        'encrypt', help='encrypt a {"tenant": "token"} JSON file'
+    )
+    encrypt.add_argument('source')
+    encrypt.add_argument('target')
+    args = parser.parse_args(argv)
+    if args.command == 'keygen':
+        print(Fernet.generate_key().decode())
+        return
+    key = os.getenv('CREDENTIALS_KEY')
+    if not key:
+        sys.exit('CREDENTIALS_KEY is missing')
+    with open(args.source, encoding='utf-8') as file:
+        tokens = json.load(file)
+    with open(args.target, 'wb') as file:
+        file.write(encrypt_tokens(tokens, key))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+
+CURSOR_OVERLAP = 60
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def parse_date(value):
+    """Переводим date_updated из ответа API в timestamp."""
+    moment = datetime.strptime(value, DATE_FORMAT)
+    return int(moment.replace(tzinfo=timezone.utc).timestamp())
+
+
+def parse_moment(value):
+    """Переводим timestamp или дату ISO 8601 в timestamp."""
+    if value.isdigit():
+        return int(value)
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+class Cursor:
+    """Курсор from_date для опроса API.
+
+    После каждого ответа курсор сдвигается к current_date, но следующий
+    запрос захватывает ещё overlap секунд назад, чтобы не потерять
+    работы при расхождении часов. Повторно пришедшие из окна перекрытия
+    работы отбрасываются по паре (homework_name, date_updated), поэтому
+    размер ответа не растёт со временем работы бота.
+    """
+
+    def __init__(self, start, overlap=CURSOR_OVERLAP):
+        self.from_date = int(start)
+        self.overlap = overlap
+        self.seen = {}
+
+    def fresh(self, response):
+        """Возвращаем работы из ответа, которых ещё не было.
+
+        Работы возвращаются в порядке ответа API: от новых к старым.
+        Курсор не меняется: обработанные работы отмечаются через mark(),
+        поэтому работа, на которой обработка прервалась, придёт снова.
+        """
+        return [
+            homework for homework in response['homeworks']
+            if homework.get('date_updated') is None
+            or self.key(homework) not in self.seen
+        ]
+
+    def mark(self, homework):
+        """Запоминаем обработанную работу."""
+        date_updated = homework.get('date_updated')
+        if date_updated is not None:
+            self.seen[self.key(homework)] = parse_date(date_updated)
+
+    def advance(self, response):
+        """Сдвигаем курсор к current_date ответа."""
+        current_date = response.get('current_date')
+        if isinstance(current_date, int):
+            self.from_date = max(self.from_date, current_date - self.overlap)
+        self.forget()
+
+    @staticmethod
+    def key(homework):
+        """Ключ работы для отбрасывания повторов."""
+        return homework.get('homework_name'), homework['date_updated']
+
+    def forget(self):
+        """Удаляем из памяти работы, вышедшие из окна перекрытия."""
+        self.seen = {
+            key: timestamp for key, timestamp in self.seen.items()
+            if timestamp >= self.from_date
+        }
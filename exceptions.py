@@ -2,3 +2,15 @@ class SendMessageError(Exception):
     """Кастомный класс для ошибки отправки сообщения."""
 
     pass
+
+
+class InvalidTokenError(Exception):
+    """Токен Практикума отклонён API (401)."""
+
+    pass
+
+
+class UnknownStatusError(KeyError):
+    """Недокументированный статус домашней работы."""
+
+    pass
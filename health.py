@@ -0,0 +1,146 @@
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PORT = 8080
+WATCHDOG_INTERVAL = 5
+
+
+class Watchdog:
+    """Следим, что цикл бота и этапы конвейера продвигаются.
+
+    beat(name) отмечает событие: виток цикла, успешный запрос к API,
+    успешную отправку. expect(name, threshold) требует, чтобы событие
+    случалось не реже threshold секунд; с after=other требование
+    действует, только пока other произошло позже name (например,
+    отправка начата, но так и не завершилась). Поток watchdog
+    опрашивает метрики этапов и считает этап зависшим, если в его
+    очереди есть элементы, а счётчик обработанных не растёт.
+    """
+
+    def __init__(self, clock=time.monotonic, interval=WATCHDOG_INTERVAL):
+        self.clock = clock
+        self.interval = interval
+        self.started = clock()
+        self.beats = {}
+        self.expectations = {}
+        self.stages = None
+        self.stage_threshold = None
+        self.progress = {}
+        self.ready = False
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def beat(self, name):
+        """Отмечаем, что событие name произошло сейчас."""
+        self.beats[name] = self.clock()
+
+    def expect(self, name, threshold, after=None):
+        """Требуем, чтобы событие name было не старше threshold секунд."""
+        self.expectations[name] = (threshold, after)
+
+    def watch_stages(self, metrics, threshold):
+        """Следим за этапами по функции, возвращающей их метрики."""
+        self.stages = metrics
+        self.stage_threshold = threshold
+
+    def mark_ready(self):
+        """Отмечаем, что бот запущен и готов работать."""
+        self.ready = True
+
+    def start(self):
+        """Запускаем поток watchdog."""
+        self.thread = threading.Thread(
+            target=self.run, name='watchdog', daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        """Останавливаем поток watchdog."""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        """Периодически снимаем метрики этапов."""
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Запоминаем, когда каждый этап последний раз продвигался."""
+        if self.stages is None:
+            return
+        now = self.clock()
+        for name, metrics in self.stages().items():
+            if not isinstance(metrics, dict):
+                continue
+            processed = metrics['processed'] + metrics['errors']
+            last = self.progress.get(name)
+            if last is None or metrics['depth'] == 0 or last[0] != processed:
+                self.progress[name] = (processed, now)
+
+    def problems(self):
+        """Возвращаем список причин, по которым бот нездоров."""
+        now = self.clock()
+        problems = []
+        for name, (threshold, after) in self.expectations.items():
+            last = self.beats.get(name, self.started)
+            if after is not None and self.beats.get(after, 0) <= last:
+                continue
+            if now - last > threshold:
+                problems.append(f'no {name} for {int(now - last)}s')
+        for name, (_, last) in self.progress.items():
+            if now - last > self.stage_threshold:
+                problems.append(
+                    f'{name} stage is stuck for {int(now - last)}s'
+                )
+        return problems
+
+    def status(self):
+        """Возвращаем состояние для /healthz и /readyz."""
+        problems = self.problems()
+        return {
+            'healthy': not problems,
+            'ready': self.ready and not problems,
+            'problems': problems,
+        }
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    """Отвечаем на /healthz и /readyz по состоянию watchdog."""
+
+    watchdog = None
+
+    def do_GET(self):
+        """Отдаём 200, если проверка пройдена, иначе 503."""
+        checks = {'/healthz': 'healthy', '/readyz': 'ready'}
+        if self.path not in checks:
+            self.send_error(404)
+            return
+        status = self.watchdog.status()
+        body = json.dumps(status).encode('utf-8')
+        self.send_response(200 if status[checks[self.path]] else 503)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Пишем запросы в лог бота, а не в stderr."""
+        logger.debug(f'health: {format % args}')
+
+
+def start_server(watchdog, port=HEALTH_PORT, host=''):
+    """Запускаем HTTP-сервер проверок в фоновом потоке."""
+    handler = type('Handler', (HealthHandler,), {'watchdog': watchdog})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(
+        target=server.serve_forever, name='health', daemon=True
+    )
+    thread.start()
+    return server
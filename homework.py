@@ -1,3 +1,4 @@
+import json
 import logging
 import os
 import sys
@@ -6,16 +7,44 @@ import time
 import requests
 from dotenv import load_dotenv
 from telegram import Bot, TelegramError
+from telegram.utils.request import Request
 
-from exceptions import SendMessageError
+from credentials import DEFAULT_TENANT, CredentialProvider
+from cursor import Cursor, parse_date
+from exceptions import (
+    InvalidTokenError, SendMessageError, UnknownStatusError
+)
+from health import Watchdog, start_server
+from logstore import LOG_DIR, CompactLogHandler
+from notifiers import (
+    EmailTransport, Notifier, TelegramTransport, WebhookTransport
+)
+from pipeline import PIPELINE_WORKERS, Pipeline
+from rules import (
+    ESCALATE, FALLBACK_NOTIFY, FALLBACK_SKIP, HOLD, NOTIFY, SKIP, RuleEngine
+)
+from state_index import HomeworkIndex
 
 load_dotenv()
 
 PRACTICUM_TOKEN = os.getenv('PRACTICUM_TOKEN')
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+CREDENTIALS_FILE = os.getenv('CREDENTIALS_FILE')
+CREDENTIALS_KEY = os.getenv('CREDENTIALS_KEY')
 
 RETRY_TIME = 600
+REQUEST_TIMEOUT = 30
+HEALTH_THRESHOLD = 3 * RETRY_TIME
+PIPELINE_WAIT = RETRY_TIME // 2
+STATE_FILE = 'homework_state.idx'
+PENDING_FILE = 'homework_pending.json'
+RULES_FILE = os.getenv('RULES_FILE')
+HEALTH_PORT = os.getenv('HEALTH_PORT')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+MAIL_RELAY = os.getenv('MAIL_RELAY')
+MAIL_FROM = os.getenv('MAIL_FROM', 'check-bot@localhost')
+MAIL_TO = os.getenv('MAIL_TO')
 ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
 
 HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
@@ -27,10 +56,8 @@ HOMEWORK_STATUSES = {
 }
 
 logging.basicConfig(
-    handlers=[logging.FileHandler('homework.log', 'w', 'utf-8')],
-    level=logging.DEBUG,
-    format='%(asctime)s, %(levelname)s, %(message)s',
-    datefmt='%y-%m-%d %H:%M:%S'
+    handlers=[CompactLogHandler(LOG_DIR)],
+    level=logging.DEBUG
 )
 logger = logging.getLogger(__name__)
 
@@ -46,16 +73,24 @@ def send_message(bot, message):
 
 def get_api_answer(current_timestamp):
     """Получаем ответ от API."""
+    return request_api(current_timestamp, HEADERS)
+
+
+def request_api(current_timestamp, headers):
+    """Запрашиваем API с заголовками конкретного токена."""
     timestamp = current_timestamp or int(time.time())
     params = {'from_date': timestamp}
     try:
         response = requests.get(
             ENDPOINT,
-            headers=HEADERS,
-            params=params
+            headers=headers,
+            params=params,
+            timeout=REQUEST_TIMEOUT
         )
     except Exception as error:
         raise Exception(f'Ошибка при запросе к API: {error}')
+    if response.status_code == 401:
+        raise InvalidTokenError('API rejected the token with 401')
     if response.status_code != 200:
         status_code = response.status_code
         raise Exception(
@@ -95,85 +130,501 @@ def parse_status(homework):
         raise KeyError('key "status" is missing')
     homework_status = homework['status']
     if homework_status not in HOMEWORK_STATUSES:
-        raise KeyError('key {homework_status} not in HOMEWORK_STATUSES')
+        raise UnknownStatusError(
+            f'key {homework_status} not in HOMEWORK_STATUSES'
+        )
     verdict = HOMEWORK_STATUSES[homework_status]
     return f'Изменился статус проверки работы "{homework_name}". {verdict}'
 
 
+def describe_unknown_status(homework):
+    """Готовим сообщение о недокументированном статусе работы."""
+    return (
+        f'Изменился статус проверки работы "{homework["homework_name"]}". '
+        f'Новый статус: {homework["status"]}'
+    )
+
+
+def describe_overdue(homework, age):
+    """Готовим сообщение о работе, долго не меняющей статус."""
+    return (
+        f'Статус проверки работы "{homework["homework_name"]}" '
+        f'не меняется {age // 3600} ч: {homework["status"]}'
+    )
+
+
+def homework_key(homework):
+    """Ключ работы для отложенных уведомлений и напоминаний."""
+    return homework.get('id', homework['homework_name'])
+
+
 def check_tokens():
     """Проверяем корректнось токенов."""
     keys = {
-        'PRACTICUM_TOKEN': PRACTICUM_TOKEN,
+        'PRACTICUM_TOKEN': PRACTICUM_TOKEN or CREDENTIALS_FILE,
         'TELEGRAM_TOKEN': TELEGRAM_TOKEN,
         'TELEGRAM_CHAT_ID': TELEGRAM_CHAT_ID
     }
+    if CREDENTIALS_FILE:
+        keys['CREDENTIALS_KEY'] = CREDENTIALS_KEY
     for key, value in keys.items():
         if value is None:
             logger.critical(f'{key} is missing')
-    return bool(PRACTICUM_TOKEN and TELEGRAM_TOKEN and TELEGRAM_CHAT_ID)
+    return all(keys.values())
 
 
-def main():
-    """Основная логика работы бота."""
-    logger.debug('main function is started')
-    check_dict = {
-        'homework_name': '',
-        'status': ''
+class TenantFetcher:
+    """Запросы к API с токеном одного tenant из CredentialProvider.
+
+    Заголовки берутся из провайдера при каждом запросе, поэтому
+    замена токена подхватывается без перезапуска.
+    """
+
+    def __init__(self, credentials, tenant):
+        self.credentials = credentials
+        self.tenant = tenant
+
+    def __call__(self, current_timestamp):
+        """Получаем ответ от API для tenant."""
+        try:
+            return request_api(
+                current_timestamp, self.credentials.headers(self.tenant)
+            )
+        except InvalidTokenError:
+            self.credentials.invalidate(self.tenant)
+            raise InvalidTokenError(
+                f'token of {self.tenant} is rejected by API, '
+                'polling is stopped until the token is replaced'
+            )
+
+
+class HomeworkPoller:
+    """Состояние и один цикл опроса API для одной подписки.
+
+    Источник ответов API, часы и notifier передаются извне, поэтому
+    цикл можно прогонять без сети и реального времени. Вместо
+    notifier можно передать телеграм-бота, тогда сообщения уходят
+    только в TELEGRAM_CHAT_ID. Если передан общий
+    HomeworkIndex, изменения статуса определяются по нему для каждой
+    работы, иначе - сравнением с последней полученной работой. Переход,
+    о котором нужно сообщить, записывается в индекс только после
+    доставки сообщения основным каналом, а до этого ждёт в outgoing и
+    отправляется повторно в следующих циклах.
+    rules - RuleSet чата: что делать с переходом и когда напоминать о
+    работах, застрявших в одном статусе. Отложенные правилами
+    уведомления и ожидающие напоминания можно сохранить через
+    pending() и восстановить после перезапуска через restore().
+    """
+
+    def __init__(self, notifier, fetch=None, clock=time.time, index=None,
+                 rules=None, fallback=FALLBACK_NOTIFY):
+        if not isinstance(notifier, Notifier):
+            notifier = Notifier(
+                [TelegramTransport(notifier, TELEGRAM_CHAT_ID)]
+            )
+        self.notifier = notifier
+        self.fetch = fetch or get_api_answer
+        self.clock = clock
+        self.index = index
+        self.rules = rules or RuleEngine().default
+        self.fallback = fallback
+        self.watched = {}
+        self.held = {}
+        self.outgoing = {}
+        self.check_dict = {
+            'homework_name': '',
+            'status': ''
+        }
+        self.last_error = 'no errors'
+        self.cursor = Cursor(clock())
+        logger.debug(f'current_timestamp is {self.cursor.from_date}')
+
+    def poll(self):
+        """Выполняем один цикл опроса API и отправки уведомлений."""
+        self.deliver(self.process(*self.request()))
+
+    def request(self):
+        """Запрашиваем API, ошибку возвращаем вместо исключения."""
+        try:
+            logger.debug('get_api_answer function is started')
+            response = self.fetch(self.cursor.from_date)
+            logger.debug(
+                f'response is received from {self.cursor.from_date}'
+            )
+            return response, None
+        except Exception as error:
+            return None, error
+
+    def process(self, response, error=None):
+        """Разбираем ответ API и готовим сообщения для отправки."""
+        messages = self.resend()
+        errors = [error] if error is not None else []
+        if error is None:
+            try:
+                errors = self.decode(response, messages)
+            except Exception as decode_error:
+                errors = [decode_error]
+        for error in errors:
+            messages.extend(self.report(error))
+        return messages
+
+    def decode(self, response, messages):
+        """Добавляем в messages сообщения о новых статусах работ.
+
+        Ошибка в одной работе не мешает разбору остальных: работы
+        разбираются по отдельности, ошибки возвращаются списком.
+        """
+        logger.debug('check_response function is started')
+        check_response(response)
+        homeworks = self.cursor.fresh(response)
+        logger.debug('checking for homework')
+        logger.debug(f'new homeworks are {homeworks}')
+        errors = []
+        for homework in reversed(homeworks):
+            try:
+                message = self.diff(homework)
+                self.watch(homework)
+            except Exception as error:
+                errors.append(error)
+            else:
+                if message:
+                    messages.append(message)
+            self.cursor.mark(homework)
+        self.cursor.advance(response)
+        messages.extend(self.release())
+        messages.extend(self.overdue())
+        logger.debug(f'current_timestamp is {self.cursor.from_date}')
+        return errors
+
+    def diff(self, homework):
+        """Возвращаем сообщение, если статус работы изменился."""
+        logger.debug('parse_status function is started')
+        message = self.describe(homework)
+        logger.debug('checking homework updates')
+        if self.index is not None:
+            if not self.index.changed(homework):
+                return None
+            return self.notify(homework, message)
+        logger.debug(f'old homework is {self.check_dict}')
+        current_homework = {
+            'homework_name': homework['homework_name'],
+            'status': homework['status']
+        }
+        logger.debug(f'new_homework is {current_homework}')
+        logger.debug(
+            f'homework != check_dict: {homework != self.check_dict}'
+        )
+        if current_homework != self.check_dict:
+            self.check_dict = current_homework
+            logger.debug(f'homework updated and now is {self.check_dict}')
+            return self.apply_rules(homework, message)
+        return None
+
+    def describe(self, homework):
+        """Готовим текст уведомления, учитывая fallback для статусов."""
+        try:
+            return parse_status(homework)
+        except UnknownStatusError:
+            if self.fallback == FALLBACK_NOTIFY:
+                return describe_unknown_status(homework)
+            if self.fallback == FALLBACK_SKIP:
+                return None
+            raise
+
+    def notify(self, homework, message):
+        """Применяем правила к переходу и запоминаем его в индексе.
+
+        Переход с сообщением ждёт подтверждения доставки в outgoing,
+        остальные (пропущенные и отложенные правилами) записываются
+        в индекс сразу.
+        """
+        message = self.apply_rules(homework, message)
+        if message is None:
+            self.index.update(homework)
+        else:
+            self.outgoing[homework_key(homework)] = homework
+        return message
+
+    def resend(self):
+        """Возвращаем сообщения о переходах, доставка которых не удалась."""
+        messages = []
+        for key, homework in list(self.outgoing.items()):
+            del self.outgoing[key]
+            message = self.notify(homework, self.describe(homework))
+            if message:
+                messages.append(message)
+        return messages
+
+    def confirm(self):
+        """Записываем в индекс переходы, о которых сообщение доставлено."""
+        for key, homework in list(self.outgoing.items()):
+            self.index.update(homework)
+            del self.outgoing[key]
+
+    def apply_rules(self, homework, message):
+        """Решаем по правилам чата, отправлять ли сообщение.
+
+        Отложенная правилами работа запоминается до release().
+        """
+        if message is None:
+            return None
+        action = self.rules.evaluate(homework, self.clock())
+        logger.debug(f'rules action is {action}')
+        key = homework_key(homework)
+        if action == HOLD:
+            self.held[key] = homework
+            return None
+        self.held.pop(key, None)
+        if action == SKIP:
+            return None
+        if action == ESCALATE:
+            return f'Важно! {message}'
+        return message
+
+    def release(self):
+        """Возвращаем отложенные сообщения, которые правила уже пропускают."""
+        messages = []
+        for key, homework in list(self.held.items()):
+            del self.held[key]
+            message = self.describe(homework)
+            if self.index is None:
+                message = self.apply_rules(homework, message)
+            else:
+                message = self.notify(homework, message)
+            if message:
+                messages.append(message)
+        return messages
+
+    def watch(self, homework):
+        """Запоминаем работу, если для её статуса есть правила по времени."""
+        key = homework_key(homework)
+        watched = self.rules.watches(homework['status'])
+        if watched and homework.get('date_updated'):
+            self.watched[key] = homework
+        else:
+            self.watched.pop(key, None)
+
+    def overdue(self):
+        """Возвращаем напоминания о работах, застрявших в статусе.
+
+        notify присылает обычное напоминание, escalate - с пометкой
+        о важности. Напоминание о каждой работе приходит один раз.
+        """
+        messages = []
+        now = int(self.clock())
+        for key, homework in list(self.watched.items()):
+            age = now - parse_date(homework['date_updated'])
+            action = self.rules.overdue(homework, now, age)
+            if action not in (NOTIFY, ESCALATE):
+                continue
+            message = describe_overdue(homework, age)
+            if action == ESCALATE:
+                message = f'Важно! {message}'
+            messages.append(message)
+            del self.watched[key]
+        return messages
+
+    def pending(self):
+        """Возвращаем отложенные, недоставленные и ожидающие работы."""
+        return {
+            'held': list(self.held.values()),
+            'outgoing': list(self.outgoing.values()),
+            'watched': list(self.watched.values()),
+        }
+
+    def restore(self, pending):
+        """Восстанавливаем сохранённые через pending() работы."""
+        for homework in pending.get('held', ()):
+            self.held[homework_key(homework)] = homework
+        for homework in pending.get('outgoing', ()):
+            self.outgoing[homework_key(homework)] = homework
+        for homework in pending.get('watched', ()):
+            self.watched[homework_key(homework)] = homework
+
+    def report(self, error):
+        """Логируем ошибку и возвращаем сообщение о ней, если она новая."""
+        message = f'an error in the program: {error}'
+        logger.error(message)
+        if error == self.last_error:
+            return []
+        self.last_error = error
+        logger.debug(f'{self.last_error}, {error}')
+        return [message]
+
+    def deliver(self, messages):
+        """Отправляем подготовленные сообщения во все каналы.
+
+        Возвращаем True, если сообщения доставил основной канал
+        notifier: ошибки остальных каналов логируются, но не считаются
+        сбоем отправки.
+        """
+        if not messages:
+            return True
+        logger.debug('notifier is started')
+        delivered = self.notifier.deliver(messages)[self.notifier.primary]
+        if delivered and self.index is not None:
+            self.confirm()
+        for message in messages:
+            if delivered:
+                logger.info(f'Bot just sent a message: {message}')
+            else:
+                logger.error(f"Can't send a message: {message}")
+        return delivered
+
+
+def poll_tenants(notifier, credentials, pollers, clock=time.time,
+                 run=HomeworkPoller.poll, index=None, engine=None,
+                 pending=None):
+    """Опрашиваем API по всем действующим токенам.
+
+    run(poller) выполняет опрос: сразу или через конвейер. Новые
+    подписки восстанавливают своё состояние из pending. Правила
+    берутся для TELEGRAM_CHAT_ID и действуют на все каналы notifier:
+    webhook и почта получают те же сообщения, что и телеграм-чат.
+    """
+    engine = engine or RuleEngine()
+    try:
+        credentials.refresh()
+    except Exception as error:
+        logger.error(f'credentials are not reloaded: {error}')
+    for tenant in credentials.tenants:
+        if tenant not in pollers:
+            fetch = TenantFetcher(credentials, tenant)
+            pollers[tenant] = HomeworkPoller(
+                notifier, fetch, clock, index,
+                engine.for_chat(TELEGRAM_CHAT_ID), engine.fallback
+            )
+            pollers[tenant].restore((pending or {}).get(tenant, {}))
+        run(pollers[tenant])
+
+
+def build_notifier(bot):
+    """Собираем каналы доставки: телеграм и, если заданы, webhook и почту."""
+    transports = [TelegramTransport(bot, TELEGRAM_CHAT_ID)]
+    if WEBHOOK_URL:
+        transports.append(WebhookTransport(WEBHOOK_URL))
+    if MAIL_RELAY and MAIL_TO:
+        host, _, port = MAIL_RELAY.partition(':')
+        transports.append(
+            EmailTransport(host, int(port or 25), MAIL_FROM, MAIL_TO)
+        )
+    return Notifier(transports)
+
+
+def load_credentials():
+    """Собираем токены из CREDENTIALS_FILE и PRACTICUM_TOKEN."""
+    return CredentialProvider(
+        CREDENTIALS_FILE,
+        CREDENTIALS_KEY,
+        {DEFAULT_TENANT: PRACTICUM_TOKEN} if PRACTICUM_TOKEN else None
+    )
+
+
+def load_index(path):
+    """Восстанавливаем состояние работ из файла или создаём новое."""
+    if os.path.exists(path):
+        try:
+            return HomeworkIndex.restore(path)
+        except Exception as error:
+            logger.error(f'state file {path} is not restored: {error}')
+    return HomeworkIndex(statuses=HOMEWORK_STATUSES)
+
+
+def save_index(index, path):
+    """Сохраняем состояние работ, если оно изменилось."""
+    if not index.dirty:
+        return
+    try:
+        index.snapshot(path)
+    except Exception as error:
+        logger.error(f'state file {path} is not saved: {error}')
+
+
+def load_pending(path):
+    """Читаем отложенные уведомления и напоминания подписок."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except Exception as error:
+        logger.error(f'pending file {path} is not restored: {error}')
+        return {}
+
+
+def save_pending(pollers, path):
+    """Атомарно сохраняем отложенные уведомления и напоминания."""
+    pending = {
+        tenant: poller.pending() for tenant, poller in pollers.items()
     }
-    last_error = 'no errors'
-    bot = Bot(token=TELEGRAM_TOKEN)
-    current_timestamp = int(time.time())
-    logger.debug(f'current_timestamp is {current_timestamp}')
+    temporary = f'{path}.tmp'
+    try:
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(pending, file, ensure_ascii=False)
+        os.replace(temporary, path)
+    except Exception as error:
+        logger.error(f'pending file {path} is not saved: {error}')
+
+
+def start_watchdog():
+    """Запускаем watchdog и, если задан HEALTH_PORT, HTTP-проверки."""
+    watchdog = Watchdog()
+    watchdog.expect('loop', HEALTH_THRESHOLD)
+    watchdog.expect('poll', HEALTH_THRESHOLD)
+    watchdog.expect('send', HEALTH_THRESHOLD, after='send_attempt')
+    watchdog.start()
+    if HEALTH_PORT:
+        start_server(watchdog, int(HEALTH_PORT))
+        logger.debug(f'health server is started on port {HEALTH_PORT}')
+    return watchdog
+
+
+def main(clock=time.time, sleep=time.sleep):
+    """Основная логика работы бота.
+
+    clock и sleep можно подменить, чтобы прогонять цикл на
+    симулированном времени.
+    """
+    logger.debug('main function is started')
+    bot = Bot(
+        token=TELEGRAM_TOKEN,
+        request=Request(con_pool_size=PIPELINE_WORKERS['send'] + 1)
+    )
     logger.debug('check_tokens function is started')
     if not check_tokens():
         logger.critical('Critical error. No ".env" data. Shutdown')
         sys.exit()
+    try:
+        credentials = load_credentials()
+    except Exception as error:
+        logger.critical(f'Critical error. Credentials are not loaded: {error}')
+        sys.exit()
+    notifier = build_notifier(bot)
+    pollers = {}
+    index = load_index(STATE_FILE)
+    pending = load_pending(PENDING_FILE)
+    engine = RuleEngine.from_file(RULES_FILE) if RULES_FILE else RuleEngine()
+    watchdog = start_watchdog()
+    pipeline = Pipeline(watchdog=watchdog)
+    watchdog.watch_stages(pipeline.metrics, HEALTH_THRESHOLD)
+    pipeline.start()
+    watchdog.mark_ready()
     while True:
-        try:
-            logger.debug('get_api_answer function is started')
-            response = get_api_answer(current_timestamp)
-            logger.debug(f'response is {response}')
-            logger.debug('check_response function is started')
-            homework = check_response(response)
-            logger.debug('checking for homework')
-            logger.debug(f'homework is {homework}')
-            if homework:
-                logger.debug('parse_status function is started')
-                message = parse_status(homework)
-                logger.debug('checking homework updates')
-                logger.debug(f'old homework is {check_dict}')
-                current_homework = {
-                    'homework_name': homework['homework_name'],
-                    'status': homework['status']
-                }
-                logger.debug(f'new_homework is {current_homework}')
-                logger.debug(
-                    f'homework != check_dict: {homework != check_dict}'
-                )
-                if current_homework != check_dict:
-                    check_dict = current_homework
-                    logger.debug(f'homework updated and now is {check_dict}')
-                    logger.debug('send_message function is started')
-                    send_message(bot, message)
-                    logger.info(f'Bot just sent a message: {message}')
-            current_timestamp = (
-                response.get('current_date', default=current_timestamp)
-            )
-            logger.debug(f'current_timestamp is {current_timestamp}')
-        except SendMessageError:
+        watchdog.beat('loop')
+        poll_tenants(
+            notifier, credentials, pollers, clock, pipeline.submit, index,
+            engine, pending
+        )
+        if not pipeline.wait(PIPELINE_WAIT):
             logger.error(
-                "Can't send a message. An error in the send_message function"
+                f'pipeline is not drained in {PIPELINE_WAIT}s, '
+                'saving a partial state'
             )
-        except Exception as error:
-            message = f'an error in the program: {error}'
-            logger.error(message)
-            if error != last_error:
-                send_message(bot, message)
-                last_error = error
-                logger.debug(f'{last_error}, {error}')
-        finally:
-            logger.debug(f'go to sleep for {RETRY_TIME}s')
-            time.sleep(RETRY_TIME)
+        logger.debug(f'pipeline metrics are {pipeline.metrics()}')
+        save_index(index, STATE_FILE)
+        save_pending(pollers, PENDING_FILE)
+        logger.debug(f'go to sleep for {RETRY_TIME}s')
+        sleep(RETRY_TIME)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,267 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import time
+import zlib
+
+from cursor import parse_moment
+
+LOG_DIR = 'logs'
+SEGMENT_BYTES = 4 * 1024 * 1024
+SEGMENTS_KEPT = 50
+BLOCK_RECORDS = 256
+BLOCK_SECONDS = 60
+FLUSH_LEVEL = logging.INFO
+DEDUP_RECORDS = 32
+DEDUP_SECONDS = 60 * 60
+SEGMENT_PATTERN = 'homework.*.log.gz'
+DATE_FORMAT = '%y-%m-%d %H:%M:%S'
+LEVELS = {
+    name: getattr(logging, name)
+    for name in ('NOTSET', 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+}
+
+
+def compress(data):
+    """Сжимаем блок в отдельный gzip-член."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def segment_index_path(path):
+    """Путь к индексу сегмента."""
+    return path[:-len('.log.gz')] + '.idx'
+
+
+class CompactLogHandler(logging.Handler):
+    """Обработчик логов с дедупликацией, сжатием и индексом по времени.
+
+    Одинаковые записи (уровень, текст и traceback) сворачиваются в
+    одну запись с числом повторов и временем последнего повтора, даже
+    если между ними были другие строки: последние dedup_records
+    разных записей остаются открытыми сериями не дольше dedup_seconds,
+    поэтому строки каждого цикла опроса не размножаются по циклам.
+    Серия закрывается, когда её вытесняет новая запись или истекает
+    её время, и попадает в блок. Блоки копятся по BLOCK_RECORDS
+    записей (или BLOCK_SECONDS секунд), запись уровня flush_level и
+    выше закрывает все серии и сразу сбрасывает блок на диск, чтобы
+    при аварийном завершении терялись только отладочные записи.
+    Каждый блок дописывается в сегмент отдельным gzip-членом, а в
+    индекс сегмента - строка с интервалом времени, смещением и
+    максимальным уровнем блока. Сегмент закрывается по размеру,
+    хранится SEGMENTS_KEPT последних. Сегменты читаются обычным zcat.
+    """
+
+    def __init__(self, directory=LOG_DIR, segment_bytes=SEGMENT_BYTES,
+                 block_records=BLOCK_RECORDS, block_seconds=BLOCK_SECONDS,
+                 segments_kept=SEGMENTS_KEPT, flush_level=FLUSH_LEVEL,
+                 dedup_records=DEDUP_RECORDS, dedup_seconds=DEDUP_SECONDS):
+        super().__init__()
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.block_records = block_records
+        self.block_seconds = block_seconds
+        self.segments_kept = segments_kept
+        self.flush_level = flush_level
+        self.dedup_records = dedup_records
+        self.dedup_seconds = dedup_seconds
+        self.traceback = logging.Formatter()
+        self.runs = {}
+        self.block = []
+        self.block_started = None
+        self.segment = None
+        os.makedirs(directory, exist_ok=True)
+
+    def emit(self, record):
+        """Добавляем запись, сворачивая повторы."""
+        try:
+            message = record.getMessage()
+            details = self.details(record)
+            now = record.created
+            self.expire(now)
+            key = (record.levelno, message, details)
+            run = self.runs.get(key)
+            if run is not None:
+                run['n'] += 1
+                run['e'] = now
+                return
+            run = {'t': now, 'e': now, 'l': record.levelno, 'm': message,
+                   'n': 1}
+            if details:
+                run['x'] = details
+            self.runs[key] = run
+            if record.levelno >= self.flush_level:
+                self.push_all(now)
+                self.write_block()
+            elif len(self.runs) > self.dedup_records:
+                self.push(next(iter(self.runs)), now)
+        except Exception:
+            self.handleError(record)
+
+    def expire(self, now):
+        """Закрываем серии, открытые дольше dedup_seconds."""
+        while self.runs:
+            key = next(iter(self.runs))
+            if now - self.runs[key]['t'] < self.dedup_seconds:
+                return
+            self.push(key, now)
+
+    def details(self, record):
+        """Возвращаем traceback и стек записи, если они есть."""
+        parts = []
+        if record.exc_info:
+            parts.append(self.traceback.formatException(record.exc_info))
+        elif record.exc_text:
+            parts.append(record.exc_text)
+        if record.stack_info:
+            parts.append(self.traceback.formatStack(record.stack_info))
+        return '\n'.join(parts) or None
+
+    def push(self, key, now):
+        """Переносим закрытую серию повторов в блок."""
+        self.block.append(self.runs.pop(key))
+        if self.block_started is None:
+            self.block_started = now
+        if (len(self.block) >= self.block_records
+                or now - self.block_started >= self.block_seconds):
+            self.write_block()
+
+    def push_all(self, now):
+        """Закрываем все серии в порядке их начала."""
+        for key in list(self.runs):
+            self.push(key, now)
+
+    def write_block(self):
+        """Сжимаем накопленный блок и дописываем его в сегмент."""
+        if not self.block:
+            return
+        lines = ''.join(
+            json.dumps(record, ensure_ascii=False) + '\n'
+            for record in self.block
+        )
+        data = compress(lines.encode('utf-8'))
+        if self.segment is None:
+            self.segment = os.path.join(
+                self.directory,
+                f'homework.{int(self.block[0]["t"] * 1000)}.log.gz'
+            )
+        with open(self.segment, 'ab') as file:
+            offset = file.tell()
+            file.write(data)
+        entry = {
+            'start': min(record['t'] for record in self.block),
+            'end': max(record['e'] for record in self.block),
+            'level': max(record['l'] for record in self.block),
+            'offset': offset,
+            'size': len(data),
+            'records': len(self.block),
+        }
+        with open(segment_index_path(self.segment), 'a') as file:
+            file.write(json.dumps(entry) + '\n')
+        self.block = []
+        self.block_started = None
+        if offset + len(data) >= self.segment_bytes:
+            self.segment = None
+            self.prune()
+
+    def prune(self):
+        """Удаляем старые сегменты, оставляя место для нового."""
+        segments = list_segments(self.directory)
+        excess = len(segments) - (self.segments_kept - 1)
+        for path in segments[:max(excess, 0)]:
+            os.remove(path)
+            os.remove(segment_index_path(path))
+
+    def flush(self):
+        """Сбрасываем на диск всё накопленное."""
+        self.acquire()
+        try:
+            for key in list(self.runs):
+                self.block.append(self.runs.pop(key))
+            self.write_block()
+        finally:
+            self.release()
+
+    def close(self):
+        """Сбрасываем записи и закрываем обработчик."""
+        self.flush()
+        super().close()
+
+
+def list_segments(directory=LOG_DIR):
+    """Возвращаем сегменты в порядке времени начала."""
+    return sorted(
+        glob.glob(os.path.join(directory, SEGMENT_PATTERN)),
+        key=lambda path: int(os.path.basename(path).split('.')[1])
+    )
+
+
+def read_index(path):
+    """Читаем индекс блоков сегмента."""
+    with open(segment_index_path(path)) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def query(directory=LOG_DIR, since=None, until=None, level=logging.NOTSET,
+          text=None):
+    """Находим записи по интервалу времени, уровню и подстроке.
+
+    По индексам выбираются только блоки, пересекающие интервал и
+    содержащие записи нужного уровня, и читаются только они. Серия
+    повторов попадает в сегмент при закрытии и может начинаться
+    раньше него, поэтому интервал проверяется по индексам блоков, а
+    не по времени в имени сегмента.
+    """
+    since = float('-inf') if since is None else since
+    until = float('inf') if until is None else until
+    for path in list_segments(directory):
+        with open(path, 'rb') as file:
+            for block in read_index(path):
+                if (block['end'] < since or block['start'] > until
+                        or block['level'] < level):
+                    continue
+                file.seek(block['offset'])
+                data = zlib.decompress(
+                    file.read(block['size']), 16 + zlib.MAX_WBITS
+                )
+                for line in data.decode('utf-8').splitlines():
+                    record = json.loads(line)
+                    if (record['e'] >= since and record['t'] <= until
+                            and record['l'] >= level
+                            and (text is None or text in record['m'])):
+                        yield record
+
+
+def format_record(record):
+    """Печатаем запись в формате homework.log."""
+    moment = time.strftime(DATE_FORMAT, time.localtime(record['t']))
+    line = (
+        f'{moment}, {logging.getLevelName(record["l"])}, {record["m"]}'
+    )
+    if record['n'] > 1:
+        last = time.strftime(DATE_FORMAT, time.localtime(record['e']))
+        line += f' (repeated {record["n"]} times until {last})'
+    if 'x' in record:
+        line += '\n' + record['x']
+    return line
+
+
+def main(argv=None):
+    """Ищем записи в логах бота из командной строки."""
+    parser = argparse.ArgumentParser(description='Query homework logs')
+    parser.add_argument('--dir', default=LOG_DIR)
+    parser.add_argument('--since', type=parse_moment)
+    parser.add_argument('--until', type=parse_moment)
+    parser.add_argument('--level', default='NOTSET', type=str.upper,
+                        choices=LEVELS)
+    parser.add_argument('--text')
+    args = parser.parse_args(argv)
+    for record in query(args.dir, args.since, args.until,
+                        LEVELS[args.level], args.text):
+        print(format_record(record))
+
+
+if __name__ == '__main__':
+    main()
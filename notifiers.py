@@ -0,0 +1,231 @@
+import abc
+import logging
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+import requests
+from requests.adapters import HTTPAdapter
+from telegram import TelegramError
+
+from exceptions import SendMessageError
+
+logger = logging.getLogger(__name__)
+
+TRANSPORT_RETRIES = 3
+TRANSPORT_BACKOFF = 1
+TRANSPORT_TIMEOUT = 10
+TRANSPORT_POOL_SIZE = 4
+
+
+class Transport(abc.ABC):
+    """Канал доставки уведомлений.
+
+    max_batch - сколько сообщений канал умеет отправить за один вызов
+    send_batch(). Ошибки отправки канал превращает в SendMessageError.
+    """
+
+    name = 'transport'
+    max_batch = 1
+
+    @abc.abstractmethod
+    def send_batch(self, messages):
+        """Отправляем пачку не больше max_batch сообщений."""
+
+    def close(self):
+        """Закрываем соединения канала."""
+        pass
+
+
+class TelegramTransport(Transport):
+    """Отправка в телеграм-чат, по одному сообщению."""
+
+    name = 'telegram'
+
+    def __init__(self, bot, chat_id):
+        self.bot = bot
+        self.chat_id = chat_id
+
+    def send_batch(self, messages):
+        """Отправляем сообщение в телеграм чат."""
+        for message in messages:
+            try:
+                self.bot.send_message(self.chat_id, message)
+            except TelegramError as error:
+                raise SendMessageError(error)
+
+
+class WebhookTransport(Transport):
+    """Отправка в webhook в стиле Slack: {"text": "..."}.
+
+    Соединения переиспользуются через пул requests.Session, пачка
+    сообщений уходит одним запросом.
+    """
+
+    name = 'webhook'
+    max_batch = 20
+
+    def __init__(self, url, pool_size=TRANSPORT_POOL_SIZE,
+                 timeout=TRANSPORT_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def send_batch(self, messages):
+        """Отправляем пачку сообщений одним запросом."""
+        try:
+            response = self.session.post(
+                self.url,
+                json={'text': '\n\n'.join(messages)},
+                timeout=self.timeout
+            )
+        except requests.RequestException as error:
+            raise SendMessageError(error)
+        if response.status_code >= 300:
+            raise SendMessageError(
+                f'webhook status_code expected 2xx, but got '
+                f'{response.status_code}'
+            )
+
+    def close(self):
+        """Закрываем пул соединений."""
+        self.session.close()
+
+
+class EmailTransport(Transport):
+    """Отправка писем через локальный почтовый релей.
+
+    Соединение с релеем держится открытым и переоткрывается, если
+    релей его закрыл. Пачка сообщений уходит одним письмом.
+    """
+
+    name = 'email'
+    max_batch = 50
+
+    def __init__(self, host, port, sender, recipient,
+                 timeout=TRANSPORT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipient = recipient
+        self.timeout = timeout
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def send_batch(self, messages):
+        """Отправляем пачку сообщений одним письмом."""
+        letter = EmailMessage()
+        letter['From'] = self.sender
+        letter['To'] = self.recipient
+        letter['Subject'] = 'Статус проверки домашней работы'
+        letter.set_content('\n\n'.join(messages))
+        with self.lock:
+            try:
+                self.connect().send_message(letter)
+            except smtplib.SMTPServerDisconnected:
+                self.connection = None
+                raise SendMessageError('mail relay closed the connection')
+            except (smtplib.SMTPException, OSError) as error:
+                raise SendMessageError(error)
+
+    def connect(self):
+        """Возвращаем открытое соединение с релеем."""
+        if self.connection is None:
+            self.connection = smtplib.SMTP(
+                self.host, self.port, timeout=self.timeout
+            )
+        return self.connection
+
+    def close(self):
+        """Закрываем соединение с релеем."""
+        with self.lock:
+            if self.connection is not None:
+                self.connection.quit()
+                self.connection = None
+
+
+class Notifier:
+    """Рассылка уведомлений по всем каналам.
+
+    Каналы работают параллельно и независимо: у каждого свои пачки,
+    повторы с нарастающей паузой и свои ошибки, которые не мешают
+    доставке в остальные каналы. С одним каналом отправка идёт в
+    вызывающем потоке, без пула. Первый канал - основной (primary): по
+    нему вызывающий код решает, доставлено ли уведомление.
+    """
+
+    def __init__(self, transports, retries=TRANSPORT_RETRIES,
+                 backoff=TRANSPORT_BACKOFF, sleep=time.sleep):
+        self.transports = list(transports)
+        self.primary = self.transports[0].name
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.executor = None
+        if len(self.transports) > 1:
+            self.executor = ThreadPoolExecutor(
+                max_workers=len(self.transports),
+                thread_name_prefix='notifier'
+            )
+
+    def deliver(self, messages):
+        """Отправляем сообщения во все каналы.
+
+        Возвращаем {имя канала: доставил ли он все сообщения}.
+        """
+        if not messages:
+            return {transport.name: True for transport in self.transports}
+        if self.executor is None:
+            return {
+                transport.name: self.deliver_to(transport, messages)
+                for transport in self.transports
+            }
+        futures = {
+            transport.name: self.executor.submit(
+                self.deliver_to, transport, messages
+            )
+            for transport in self.transports
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+    def deliver_to(self, transport, messages):
+        """Отправляем сообщения в один канал пачками, с повторами."""
+        delivered = True
+        size = transport.max_batch
+        for start in range(0, len(messages), size):
+            batch = messages[start:start + size]
+            if not self.send_with_retries(transport, batch):
+                delivered = False
+        return delivered
+
+    def send_with_retries(self, transport, batch):
+        """Пытаемся отправить пачку, повторяя при ошибках."""
+        for attempt in range(1, self.retries + 1):
+            try:
+                transport.send_batch(batch)
+                logger.info(
+                    f'{transport.name} just sent {len(batch)} message(s)'
+                )
+                return True
+            except SendMessageError as error:
+                logger.error(
+                    f"Can't send a message via {transport.name}, "
+                    f'attempt {attempt}: {error}'
+                )
+                if attempt < self.retries:
+                    self.sleep(self.backoff * 2 ** (attempt - 1))
+        return False
+
+    def close(self):
+        """Закрываем каналы и пул потоков."""
+        if self.executor is not None:
+            self.executor.shutdown()
+        for transport in self.transports:
+            transport.close()
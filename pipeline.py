@@ -0,0 +1,205 @@
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_WORKERS = {
+    'fetch': 4,
+    'decode': 2,
+    'send': 2,
+}
+PIPELINE_QUEUE_SIZE = 100
+
+
+class Stage:
+    """Этап конвейера: очередь ограниченного размера и пул потоков.
+
+    handler(item) возвращает элемент для следующего этапа или None.
+    Передача в следующий этап блокируется, пока его очередь полна,
+    так что медленный этап притормаживает предыдущие, а не копит
+    бесконечную очередь.
+    """
+
+    def __init__(self, name, handler, workers=1, maxsize=PIPELINE_QUEUE_SIZE,
+                 on_error=None):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue = queue.Queue(maxsize)
+        self.next = None
+        self.on_error = on_error
+        self.threads = []
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+        self.max_depth = 0
+
+    def start(self):
+        """Запускаем потоки этапа."""
+        for number in range(self.workers):
+            thread = threading.Thread(
+                target=self.run, name=f'{self.name}-{number}', daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, item, block=True):
+        """Кладём элемент в очередь этапа."""
+        self.queue.put(item, block)
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def run(self):
+        """Обрабатываем элементы очереди до получения None."""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            try:
+                result = self.handler(item)
+                if result is not None and self.next is not None:
+                    self.next.put(result)
+                with self.lock:
+                    self.processed += 1
+            except Exception as error:
+                logger.error(f'an error in the {self.name} stage: {error}')
+                with self.lock:
+                    self.errors += 1
+                if self.on_error is not None:
+                    self.on_error(item)
+            finally:
+                self.queue.task_done()
+
+    def stop(self):
+        """Останавливаем потоки этапа после обработки очереди."""
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def metrics(self):
+        """Возвращаем счётчики и глубину очереди этапа."""
+        return {
+            'workers': self.workers,
+            'depth': self.queue.qsize(),
+            'max_depth': self.max_depth,
+            'processed': self.processed,
+            'errors': self.errors,
+        }
+
+
+class Pipeline:
+    """Конвейер опроса: запрос к API, разбор ответа и отправка.
+
+    Каждый этап работает в своих потоках, поэтому медленная отправка
+    в телеграм не задерживает запросы по другим подпискам. Подписка
+    находится в конвейере не больше чем в одном экземпляре: пока её
+    сообщения не отправлены, новые запросы по ней пропускаются. При
+    перегрузке submit() не ждёт, а пропускает опрос и считает это в
+    метрике skipped. Если передан watchdog, конвейер отмечает в нём
+    успешные запросы к API (poll), начатые (send_attempt) и успешные
+    (send) отправки. Успешной считается отправка, для которой
+    poller.deliver() вернул True, то есть доставка основным каналом.
+    """
+
+    def __init__(self, workers=None, maxsize=PIPELINE_QUEUE_SIZE,
+                 watchdog=None):
+        workers = {**PIPELINE_WORKERS, **(workers or {})}
+        self.watchdog = watchdog
+        self.fetch = Stage(
+            'fetch', self.fetch_handler, workers['fetch'], maxsize,
+            self.on_error
+        )
+        self.decode = Stage(
+            'decode', self.decode_handler, workers['decode'], maxsize,
+            self.on_error
+        )
+        self.send = Stage(
+            'send', self.send_handler, workers['send'], maxsize,
+            self.on_error
+        )
+        self.fetch.next = self.decode
+        self.decode.next = self.send
+        self.stages = (self.fetch, self.decode, self.send)
+        self.in_flight = set()
+        self.idle = threading.Condition()
+        self.skipped = 0
+
+    def start(self):
+        """Запускаем все этапы."""
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self):
+        """Дожидаемся обработки очередей и останавливаем этапы."""
+        for stage in self.stages:
+            stage.stop()
+
+    def submit(self, poller):
+        """Ставим подписку в очередь опроса, не блокируясь."""
+        with self.idle:
+            if poller in self.in_flight:
+                self.skipped += 1
+                return False
+            try:
+                self.fetch.put((poller,), block=False)
+            except queue.Full:
+                self.skipped += 1
+                return False
+            self.in_flight.add(poller)
+        return True
+
+    def wait(self, timeout=None):
+        """Ждём, пока все поставленные подписки пройдут конвейер."""
+        with self.idle:
+            return self.idle.wait_for(lambda: not self.in_flight, timeout)
+
+    def release(self, poller):
+        """Отмечаем, что подписка прошла конвейер."""
+        with self.idle:
+            self.in_flight.discard(poller)
+            self.idle.notify_all()
+
+    def on_error(self, item):
+        """Освобождаем подписку, если этап упал с ошибкой."""
+        self.release(item[0])
+
+    def fetch_handler(self, item):
+        """Запрашиваем API по подписке."""
+        poller, = item
+        response, error = poller.request()
+        if error is None:
+            self.beat('poll')
+        return poller, response, error
+
+    def decode_handler(self, item):
+        """Разбираем ответ и готовим сообщения."""
+        poller, response, error = item
+        return poller, poller.process(response, error)
+
+    def send_handler(self, item):
+        """Отправляем сообщения и освобождаем подписку."""
+        poller, messages = item
+        try:
+            if messages:
+                self.beat('send_attempt')
+                if poller.deliver(messages):
+                    self.beat('send')
+        finally:
+            self.release(poller)
+
+    def beat(self, name):
+        """Отмечаем событие в watchdog, если он подключён."""
+        if self.watchdog is not None:
+            self.watchdog.beat(name)
+
+    def metrics(self):
+        """Возвращаем метрики всех этапов конвейера."""
+        metrics = {stage.name: stage.metrics() for stage in self.stages}
+        metrics['in_flight'] = len(self.in_flight)
+        metrics['skipped'] = self.skipped
+        return metrics
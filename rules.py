@@ -0,0 +1,188 @@
+import json
+import sys
+import time
+
+NOTIFY = 'notify'
+SKIP = 'skip'
+ESCALATE = 'escalate'
+HOLD = 'hold'
+ACTIONS = (NOTIFY, SKIP, ESCALATE, HOLD)
+TIMER_ACTIONS = (NOTIFY, ESCALATE)
+FALLBACK_NOTIFY = 'notify'
+FALLBACK_SKIP = 'skip'
+FALLBACK_ERROR = 'error'
+FALLBACKS = (FALLBACK_NOTIFY, FALLBACK_SKIP, FALLBACK_ERROR)
+DEFAULT_CHAT = 'default'
+WILDCARD = '*'
+HOUR = 60 * 60
+
+
+def hours_between(start, end):
+    """Возвращаем множество часов суток от start до end, не включая end."""
+    if start <= end:
+        return frozenset(range(start, end))
+    return frozenset(range(start, 24)) | frozenset(range(0, end))
+
+
+def compile_rule(rule, utc_offset=0):
+    """Собираем из описания правила одну функцию-предикат.
+
+    Условия правила проверяются один раз здесь, а предикат только
+    сравнивает уже подготовленные значения. Предикат принимает
+    (homework, now, age) и возвращает True, если правило сработало.
+    Правило с quiet_hours по умолчанию откладывает уведомление (hold),
+    правило с older_than - поднимает тревогу (escalate). Правилам по
+    времени нечего откладывать или пропускать, hold и skip для них
+    считаются ошибкой.
+    """
+    if 'older_than' in rule:
+        default = ESCALATE
+    elif 'quiet_hours' in rule:
+        default = HOLD
+    else:
+        default = NOTIFY
+    action = rule.get('action', default)
+    if action not in ACTIONS:
+        raise ValueError(f'unknown rule action: {action}')
+    if 'older_than' in rule and action not in TIMER_ACTIONS:
+        raise ValueError(f'older_than rule cannot {action}')
+    checks = []
+    if 'quiet_hours' in rule:
+        quiet = hours_between(*rule['quiet_hours'])
+        offset = int(utc_offset * HOUR)
+        checks.append(
+            lambda homework, now, age: (
+                time.gmtime(now + offset).tm_hour in quiet
+            )
+        )
+    if 'older_than' in rule:
+        older_than = rule['older_than']
+        checks.append(lambda homework, now, age: age >= older_than)
+    if 'homework_name' in rule:
+        fragment = rule['homework_name']
+        checks.append(
+            lambda homework, now, age: fragment in homework['homework_name']
+        )
+    if not checks:
+        return (lambda homework, now, age: True), action
+    if len(checks) == 1:
+        return checks[0], action
+    return (
+        lambda homework, now, age: all(
+            check(homework, now, age) for check in checks
+        )
+    ), action
+
+
+class RuleSet:
+    """Скомпилированные правила одного чата, разложенные по статусам.
+
+    Правила без older_than применяются к переходам статусов, правила
+    с older_than - к работам, которые слишком долго остаются в одном
+    статусе. Для каждого статуса заранее собран свой список правил в
+    исходном порядке, правила без statuses попадают во все списки.
+    Срабатывает первое подходящее правило, если подходящих нет,
+    уведомление отправляется. Отложенное (hold) уведомление
+    отправляется, когда правило для него перестанет срабатывать.
+    """
+
+    def __init__(self, rules=(), utc_offset=0):
+        self.transitions = {WILDCARD: []}
+        self.timers = {WILDCARD: []}
+        for rule in rules:
+            index = self.timers if 'older_than' in rule else self.transitions
+            compiled = compile_rule(rule, utc_offset)
+            statuses = rule.get('statuses')
+            if statuses is None:
+                for bucket in index.values():
+                    bucket.append(compiled)
+                continue
+            for status in statuses:
+                if status not in index:
+                    index[status] = list(index[WILDCARD])
+                index[status].append(compiled)
+
+    def evaluate(self, homework, now, age=0):
+        """Выбираем действие для перехода работы в новый статус."""
+        return self.first(self.transitions, homework, now, age, NOTIFY)
+
+    def overdue(self, homework, now, age):
+        """Выбираем действие для работы, долго не меняющей статус."""
+        return self.first(self.timers, homework, now, age, None)
+
+    def watches(self, status):
+        """Проверяем, есть ли правила по времени для статуса."""
+        return bool(self.timers.get(status, self.timers[WILDCARD]))
+
+    @staticmethod
+    def first(index, homework, now, age, default):
+        """Возвращаем действие первого сработавшего правила."""
+        rules = index.get(homework['status'])
+        if rules is None:
+            rules = index[WILDCARD]
+        for predicate, action in rules:
+            if predicate(homework, now, age):
+                return action
+        return default
+
+
+class RuleEngine:
+    """Правила уведомлений для всех чатов.
+
+    Настройки читаются из JSON вида
+    {"fallback": "notify", "utc_offset": 3,
+     "chats": {"default": [...], "<chat_id>": [...]}}.
+    fallback определяет, что делать с недокументированным статусом:
+    notify - уведомить, skip - пропустить, error - считать ошибкой.
+    """
+
+    def __init__(self, chats=None, fallback=FALLBACK_NOTIFY, utc_offset=0):
+        if fallback not in FALLBACKS:
+            raise ValueError(f'unknown fallback: {fallback}')
+        self.fallback = fallback
+        self.chats = {
+            str(chat): RuleSet(rules, utc_offset)
+            for chat, rules in (chats or {}).items()
+        }
+        self.default = self.chats.get(DEFAULT_CHAT, RuleSet())
+
+    @classmethod
+    def from_file(cls, path):
+        """Читаем правила из JSON-файла."""
+        with open(path, encoding='utf-8') as file:
+            config = json.load(file)
+        return cls(
+            config.get('chats'),
+            config.get('fallback', FALLBACK_NOTIFY),
+            config.get('utc_offset', 0)
+        )
+
+    def for_chat(self, chat):
+        """Возвращаем правила чата или правила по умолчанию."""
+        return self.chats.get(str(chat), self.default)
+
+
+def benchmark(total=100000):
+    """Замеряем скорость проверки переходов типовым набором правил."""
+    rules = RuleSet([
+        {'quiet_hours': [23, 7], 'action': HOLD},
+        {'statuses': ['approved', 'rejected'], 'action': NOTIFY},
+        {'statuses': ['reviewing'], 'action': SKIP},
+        {'statuses': ['reviewing'], 'older_than': 48 * HOUR,
+         'action': ESCALATE},
+    ], utc_offset=3)
+    statuses = ('approved', 'reviewing', 'rejected', 'unknown')
+    homeworks = [
+        {'homework_name': f'hw{number}', 'status': statuses[number % 4]}
+        for number in range(total)
+    ]
+    now = 1600000000
+    started = time.perf_counter()
+    for homework in homeworks:
+        rules.evaluate(homework, now)
+    elapsed = time.perf_counter() - started
+    print(f'transitions per second: {total / elapsed:.0f}')
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,222 @@
+import heapq
+import logging
+import random
+from collections import Counter
+from datetime import datetime, timezone
+
+from cursor import CURSOR_OVERLAP, DATE_FORMAT
+from homework import (
+    HOMEWORK_STATUSES, RETRY_TIME, HomeworkPoller, parse_status
+)
+from state_index import HomeworkIndex
+
+DAY = 24 * 60 * 60
+STATUS_MESSAGE_PREFIX = 'Изменился статус проверки работы'
+IDS_PER_SUBSCRIPTION = 1000
+
+
+class SimulatedClock:
+    """Часы, время которых двигается только через sleep()."""
+
+    def __init__(self, start=0):
+        self.now = start
+
+    def time(self):
+        """Возвращаем текущее симулированное время."""
+        return self.now
+
+    def sleep(self, seconds):
+        """Сдвигаем время вперёд, не блокируя поток."""
+        self.now += seconds
+
+
+class FakeBot:
+    """Бот, который запоминает отправленные сообщения."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.messages = []
+
+    def send_message(self, chat_id, text):
+        """Запоминаем сообщение вместе со временем отправки."""
+        self.messages.append((self.clock.time(), text))
+
+
+class FakeAPI:
+    """Заранее заданная история статусов для одной подписки.
+
+    events - список (timestamp, homework_name, status) по возрастанию
+    времени. Ответ строится так же, как у API: работы, обновлённые
+    после from_date, в порядке от новых к старым. id работ начинаются
+    с first_id, чтобы у разных подписок они не пересекались.
+    """
+
+    def __init__(self, clock, events, first_id=1):
+        self.clock = clock
+        self.events = events
+        self.first_id = first_id
+        self.from_dates = []
+        self.current_dates = []
+        self.ids = {}
+
+    def __call__(self, from_date):
+        """Возвращаем ответ API на момент текущего времени."""
+        now = int(self.clock.time())
+        self.from_dates.append(from_date)
+        latest = {}
+        for timestamp, name, status in self.events:
+            if timestamp > now:
+                break
+            latest[name] = (timestamp, status)
+        homeworks = [
+            {
+                'id': self.ids.setdefault(
+                    name, self.first_id + len(self.ids)
+                ),
+                'homework_name': name,
+                'status': status,
+                'date_updated': to_iso(timestamp),
+            }
+            for name, (timestamp, status) in latest.items()
+            if timestamp >= from_date
+        ]
+        homeworks.sort(key=lambda item: item['date_updated'], reverse=True)
+        self.current_dates.append(now)
+        return {'homeworks': homeworks, 'current_date': now}
+
+
+class SimulationReport:
+    """Итог прогона симуляции и найденные нарушения инвариантов."""
+
+    def __init__(self):
+        self.polls = 0
+        self.sent = 0
+        self.errors = 0
+        self.missed = []
+        self.duplicates = []
+        self.cursor_stalls = 0
+
+    @property
+    def ok(self):
+        """Проверяем, что ни один инвариант не нарушен."""
+        return not (self.missed or self.duplicates or self.cursor_stalls)
+
+
+def to_iso(timestamp):
+    """Переводим timestamp в формат date_updated из ответа API."""
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return moment.strftime(DATE_FORMAT)
+
+
+def generate_events(rng, start, duration, homeworks=2,
+                    min_gap=2 * RETRY_TIME):
+    """Генерируем историю статусов для одной подписки.
+
+    Между соседними событиями проходит не меньше min_gap секунд, чтобы
+    каждый переход был виден хотя бы одному опросу. Каждое событие
+    меняет статус работы.
+    """
+    events = []
+    last = {}
+    timestamp = start + rng.randint(min_gap, 4 * min_gap)
+    while timestamp < start + duration:
+        name = f'hw{rng.randrange(homeworks)}'
+        status = rng.choice([
+            status for status in HOMEWORK_STATUSES
+            if status != last.get(name)
+        ])
+        events.append((timestamp, name, status))
+        last[name] = status
+        timestamp += rng.randint(min_gap, 12 * min_gap)
+    return events
+
+
+def expected_messages(events):
+    """Собираем сообщения, которые должен отправить корректный бот."""
+    return [
+        parse_status({'homework_name': name, 'status': status})
+        for _, name, status in events
+    ]
+
+
+def count_cursor_stalls(api, overlap=CURSOR_OVERLAP):
+    """Считаем опросы, где from_date не сдвинулся к current_date.
+
+    Допустимо отставание не больше окна перекрытия курсора.
+    """
+    stalls = 0
+    for previous, from_date in zip(api.current_dates, api.from_dates[1:]):
+        if from_date < previous - overlap:
+            stalls += 1
+    return stalls
+
+
+def check_invariants(report, events, api, bot):
+    """Сверяем отправленное с историей статусов одной подписки.
+
+    События после последнего опроса ещё не могли быть доставлены и в
+    проверку не попадают.
+    """
+    last_poll = api.current_dates[-1] if api.current_dates else None
+    events = [event for event in events
+              if last_poll is not None and event[0] <= last_poll]
+    sent = [text for _, text in bot.messages
+            if text.startswith(STATUS_MESSAGE_PREFIX)]
+    report.sent += len(sent)
+    report.errors += len(bot.messages) - len(sent)
+    expected = Counter(expected_messages(events))
+    delivered = Counter(sent)
+    report.missed.extend((expected - delivered).elements())
+    report.duplicates.extend((delivered - expected).elements())
+    report.cursor_stalls += count_cursor_stalls(api)
+
+
+def constant_interval(poller):
+    """Политика опроса по умолчанию: фиксированный RETRY_TIME."""
+    return RETRY_TIME
+
+
+def run_simulation(subscriptions=1000, days=1, seed=0, start=1600000000,
+                   interval=constant_interval, events_factory=None,
+                   use_index=False):
+    """Прогоняем опрос API для многих подписок на симулированном времени.
+
+    Все подписки опрашиваются из одной очереди по времени следующего
+    опроса. interval(poller) возвращает паузу до следующего опроса
+    подписки, это точка подключения расписаний и backoff-политик.
+    С use_index подписки, как в main(), делят один HomeworkIndex.
+    """
+    rng = random.Random(seed)
+    clock = SimulatedClock(start)
+    duration = days * DAY
+    events_factory = events_factory or generate_events
+    shared_index = (
+        HomeworkIndex(statuses=HOMEWORK_STATUSES) if use_index else None
+    )
+    subscribers = []
+    queue = []
+    for index in range(subscriptions):
+        events = events_factory(rng, start, duration)
+        api = FakeAPI(clock, events, first_id=index * IDS_PER_SUBSCRIPTION + 1)
+        bot = FakeBot(clock)
+        poller = HomeworkPoller(
+            bot, fetch=api, clock=clock.time, index=shared_index
+        )
+        subscribers.append((events, api, bot, poller))
+        queue.append((start + rng.randrange(RETRY_TIME), index))
+    heapq.heapify(queue)
+    report = SimulationReport()
+    logging.disable(logging.CRITICAL)
+    try:
+        while queue and queue[0][0] < start + duration:
+            moment, index = heapq.heappop(queue)
+            clock.sleep(moment - clock.time())
+            poller = subscribers[index][3]
+            poller.poll()
+            report.polls += 1
+            heapq.heappush(queue, (moment + interval(poller), index))
+    finally:
+        logging.disable(logging.NOTSET)
+    for events, api, bot, _ in subscribers:
+        check_invariants(report, events, api, bot)
+    return report
@@ -0,0 +1,332 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+
+from cursor import parse_date
+
+MAGIC = b'HWIX'
+VERSION = 2
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+HASH_BITS = 64
+HASH_MASK = 2 ** HASH_BITS - 1
+HEADER = struct.Struct('<4sBI')
+SECTION = struct.Struct('<Q')
+EMPTY = -2 ** 63
+MAX_STATUSES = 256
+
+
+class StringTable:
+    """Интернированные строки без отдельного объекта на строку.
+
+    Строки лежат подряд в одном bytearray, номер строки - индекс в
+    массиве смещений. Поиск по значению идёт через хеш-таблицу с
+    открытой адресацией, хеш стабилен между запусками (crc32),
+    поэтому таблицу можно сохранять на диск как есть.
+    """
+
+    def __init__(self, capacity=64):
+        self.blob = bytearray()
+        self.offsets = array('I', [0])
+        self.slots = array('i', [-1]) * capacity
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def intern(self, value):
+        """Возвращаем номер строки, добавляя её при необходимости."""
+        data = value.encode('utf-8')
+        position = self.find(data)
+        index = self.slots[position]
+        if index != -1:
+            return index
+        index = len(self)
+        self.blob += data
+        self.offsets.append(len(self.blob))
+        self.slots[position] = index
+        if len(self) * 2 > len(self.slots):
+            self.grow()
+        return index
+
+    def find(self, data):
+        """Ищем позицию строки в хеш-таблице."""
+        mask = len(self.slots) - 1
+        position = zlib.crc32(data) & mask
+        while True:
+            index = self.slots[position]
+            if index == -1 or self.encoded(index) == data:
+                return position
+            position = (position + 1) & mask
+
+    def encoded(self, index):
+        """Возвращаем строку в UTF-8 по номеру."""
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]])
+
+    def get(self, index):
+        """Возвращаем строку по номеру."""
+        return self.encoded(index).decode('utf-8')
+
+    def grow(self):
+        """Увеличиваем хеш-таблицу вдвое."""
+        self.slots = array('i', [-1]) * (len(self.slots) * 2)
+        for index in range(len(self)):
+            self.slots[self.find(self.encoded(index))] = index
+
+    def buffers(self):
+        """Возвращаем массивы для сохранения на диск."""
+        return [self.blob, self.offsets, self.slots]
+
+    @classmethod
+    def from_buffers(cls, blob, offsets, slots):
+        """Собираем таблицу из сохранённых массивов."""
+        table = cls.__new__(cls)
+        table.blob = bytearray(blob)
+        table.offsets = array('I')
+        table.offsets.frombytes(offsets)
+        table.slots = array('i')
+        table.slots.frombytes(slots)
+        return table
+
+    @property
+    def nbytes(self):
+        """Память, занимаемая таблицей."""
+        return sum(sys.getsizeof(buffer) for buffer in self.buffers())
+
+
+class HomeworkIndex:
+    """Компактное состояние отслеживаемых домашних работ.
+
+    Записи хранятся в параллельных массивах хеш-таблицы по id работы:
+    id, код статуса (1 байт), номер интернированного имени и время
+    date_updated. Статусы и имена интернируются в StringTable, коды
+    статусов из statuses совпадают с их порядком.
+    Состояние сохраняется в файл и читается обратно через mmap.
+    """
+
+    def __init__(self, capacity=1024, statuses=()):
+        self.ids = array('q', [EMPTY]) * capacity
+        self.statuses = array('B', bytes(capacity))
+        self.names = array('I', [0]) * capacity
+        self.updated = array('I', [0]) * capacity
+        self.count = 0
+        self.status_table = StringTable()
+        self.name_table = StringTable()
+        for status in statuses:
+            self.status_table.intern(status)
+        self.lock = threading.Lock()
+        self.dirty = False
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, homework_id):
+        with self.lock:
+            return self.ids[self.find(homework_id)] != EMPTY
+
+    def find(self, homework_id):
+        """Ищем позицию записи в хеш-таблице.
+
+        Позиция - старшие биты произведения id на золотое сечение
+        (фибоначчиево хеширование): они зависят от всех битов id,
+        поэтому id с одинаковыми младшими битами не собираются в
+        соседних ячейках.
+        """
+        ids = self.ids
+        mask = len(ids) - 1
+        shift = HASH_BITS - mask.bit_length()
+        position = ((homework_id * HASH_MULTIPLIER) & HASH_MASK) >> shift
+        while ids[position] != homework_id and ids[position] != EMPTY:
+            position = (position + 1) & mask
+        return position
+
+    def status_code(self, status):
+        """Переводим статус в код, интернируя новые статусы."""
+        code = self.status_table.intern(status)
+        if code >= MAX_STATUSES:
+            raise ValueError(f'too many homework statuses: {status}')
+        return code
+
+    def update(self, homework):
+        """Сохраняем работу и сообщаем, изменился ли её статус."""
+        if 'id' not in homework:
+            raise KeyError('key "id" is missing')
+        date_updated = homework.get('date_updated')
+        with self.lock:
+            code = self.status_code(homework['status'])
+            position = self.find(homework['id'])
+            if self.ids[position] != EMPTY:
+                if self.statuses[position] == code:
+                    return False
+            else:
+                self.ids[position] = homework['id']
+                self.names[position] = self.name_table.intern(
+                    homework['homework_name']
+                )
+                self.count += 1
+            self.statuses[position] = code
+            self.updated[position] = (
+                parse_date(date_updated) if date_updated else 0
+            )
+            self.dirty = True
+            if self.count * 2 > len(self.ids):
+                self.grow()
+        return True
+
+    def changed(self, homework):
+        """Проверяем, отличается ли статус работы от сохранённого."""
+        if 'id' not in homework:
+            raise KeyError('key "id" is missing')
+        with self.lock:
+            stored = self.entry(homework['id'])
+        return stored is None or stored[1] != homework['status']
+
+    def get(self, homework_id):
+        """Возвращаем (homework_name, status, date_updated) или None."""
+        with self.lock:
+            return self.entry(homework_id)
+
+    def entry(self, homework_id):
+        """Читаем запись по id, вызывающий уже держит lock.
+
+        grow() подменяет массивы целиком, поэтому чтение без
+        блокировки может попасть в ещё не заполненную таблицу и не
+        найти сохранённую работу.
+        """
+        position = self.find(homework_id)
+        if self.ids[position] == EMPTY:
+            return None
+        return (
+            self.name_table.get(self.names[position]),
+            self.status_table.get(self.statuses[position]),
+            self.updated[position]
+        )
+
+    def grow(self):
+        """Увеличиваем хеш-таблицу вдвое."""
+        self.rehash(len(self.ids) * 2)
+
+    def rehash(self, capacity):
+        """Перекладываем записи в новую хеш-таблицу размера capacity."""
+        old = (self.ids, self.statuses, self.names, self.updated)
+        self.ids = array('q', [EMPTY]) * capacity
+        self.statuses = array('B', bytes(capacity))
+        self.names = array('I', [0]) * capacity
+        self.updated = array('I', [0]) * capacity
+        for ids, status, name, updated in zip(*old):
+            if ids == EMPTY:
+                continue
+            position = self.find(ids)
+            self.ids[position] = ids
+            self.statuses[position] = status
+            self.names[position] = name
+            self.updated[position] = updated
+
+    def buffers(self):
+        """Возвращаем массивы для сохранения на диск."""
+        return [
+            self.ids, self.statuses, self.names, self.updated,
+            *self.status_table.buffers(), *self.name_table.buffers()
+        ]
+
+    @property
+    def nbytes(self):
+        """Память, занимаемая индексом."""
+        return (
+            sum(sys.getsizeof(buffer) for buffer in self.buffers()[:4])
+            + self.status_table.nbytes + self.name_table.nbytes
+        )
+
+    def snapshot(self, path):
+        """Атомарно сохраняем индекс в файл."""
+        temporary = f'{path}.tmp'
+        with self.lock:
+            with open(temporary, 'wb') as file:
+                file.write(HEADER.pack(MAGIC, VERSION, self.count))
+                for buffer in self.buffers():
+                    data = memoryview(buffer).cast('B')
+                    file.write(SECTION.pack(len(data)))
+                    file.write(data)
+            self.dirty = False
+        os.replace(temporary, path)
+
+    @classmethod
+    def restore(cls, path):
+        """Читаем индекс из файла через mmap.
+
+        Секции читаются через memoryview прямо из отображения файла и
+        копируются один раз - в массивы индекса. Файлы версии 1 были
+        записаны с прежней хеш-функцией, их записи перекладываются.
+        """
+        index = cls.__new__(cls)
+        index.ids = array('q')
+        index.statuses = array('B')
+        index.names = array('I')
+        index.updated = array('I')
+        with open(path, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                magic, version, count = HEADER.unpack_from(data)
+                if magic != MAGIC or version not in (1, VERSION):
+                    raise ValueError(f'{path} is not a homework index')
+                sections = []
+                try:
+                    with memoryview(data) as view:
+                        offset = HEADER.size
+                        while offset < len(view):
+                            size, = SECTION.unpack_from(view, offset)
+                            offset += SECTION.size
+                            sections.append(view[offset:offset + size])
+                            offset += size
+                    for target, section in zip(
+                        (index.ids, index.statuses, index.names,
+                         index.updated),
+                        sections
+                    ):
+                        target.frombytes(section)
+                    index.status_table = StringTable.from_buffers(
+                        *sections[4:7]
+                    )
+                    index.name_table = StringTable.from_buffers(
+                        *sections[7:10]
+                    )
+                finally:
+                    for section in sections:
+                        section.release()
+        index.count = count
+        index.lock = threading.Lock()
+        index.dirty = False
+        if version != VERSION:
+            index.rehash(len(index.ids))
+            index.dirty = True
+        return index
+
+
+def benchmark(total=100000):
+    """Заполняем индекс и печатаем память на одну работу и скорость."""
+    statuses = ('approved', 'reviewing', 'rejected')
+    index = HomeworkIndex(statuses=statuses)
+    started = time.perf_counter()
+    for homework_id in range(1, total + 1):
+        index.update({
+            'id': homework_id,
+            'homework_name': f'student{homework_id}__hw05_final.zip',
+            'status': statuses[homework_id % 3],
+            'date_updated': '2022-01-01T12:00:00Z',
+        })
+    elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    for homework_id in range(1, total + 1):
+        index.get(homework_id)
+    lookup = time.perf_counter() - started
+    print(f'homeworks: {len(index)}')
+    print(f'bytes per homework: {index.nbytes / len(index):.1f}')
+    print(f'updates per second: {total / elapsed:.0f}')
+    print(f'lookups per second: {total / lookup:.0f}')
+    return index
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -19,3 +19,25 @@ def current_timestamp():
 @pytest.fixture
 def api_url():
     return 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
+
+
+def make_homework(homework_id=1, status='reviewing',
+                  date_updated='2020-09-13T12:30:00Z', name=None):
+    return {
+        'id': homework_id,
+        'homework_name': name or f'hw{homework_id}',
+        'status': status,
+        'date_updated': date_updated,
+    }
+
+
+@pytest.fixture
+def homework_item():
+    return make_homework
+
+
+@pytest.fixture
+def clock():
+    from simulation import SimulatedClock
+
+    return SimulatedClock(1600000000)
@@ -0,0 +1,178 @@
+import io
+
+import pytest
+
+import backfill
+import homework
+from state_index import HomeworkIndex
+
+SINCE = 1600000000
+
+
+class Notifier:
+    primary = 'telegram'
+
+    def __init__(self, delivered):
+        self.delivered = delivered
+        self.messages = []
+
+    def deliver(self, messages):
+        self.messages.extend(messages)
+        return {'telegram': self.delivered, 'webhook': False}
+
+
+def make_fetch(items, calls):
+    def fetch(from_date):
+        calls.append(from_date)
+        return {'homeworks': list(items), 'current_date': SINCE + 86400}
+    return fetch
+
+
+def make_limiter(rate, clock, sleeps):
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock.sleep(seconds)
+    return backfill.RateLimiter(rate, clock.time, sleep)
+
+
+def make_backfill(tmp_path, clock, index=None):
+    sleeps = []
+    output = io.StringIO()
+    if index is None:
+        index = HomeworkIndex(statuses=homework.HOMEWORK_STATUSES)
+    runner = backfill.Backfill(
+        index,
+        make_limiter(2, clock, sleeps),
+        backfill.Checkpoint(str(tmp_path / 'checkpoint.json')),
+        window=3600,
+        output=output
+    )
+    return runner, output, sleeps
+
+
+def test_rate_limiter_spaces_requests(clock):
+    sleeps = []
+    limiter = make_limiter(4, clock, sleeps)
+    for _ in range(3):
+        limiter.acquire()
+    assert sleeps == [0.25, 0.25]
+
+
+def test_backfill_emits_transitions_in_order(tmp_path, homework_item, clock):
+    runner, output, sleeps = make_backfill(tmp_path, clock)
+    calls = []
+    items = [
+        homework_item(2, 'approved', '2020-09-13T15:00:00Z'),
+        homework_item(1, 'reviewing', '2020-09-13T13:00:00Z'),
+        homework_item(3, 'rejected', '2020-09-12T10:00:00Z'),
+    ]
+    failed = runner.run(
+        {'alice': make_fetch(items, calls), 'bob': make_fetch([], calls)},
+        SINCE, SINCE + 6 * 3600
+    )
+
+    assert failed == []
+    assert sorted(calls) == [SINCE, SINCE]
+    assert len(sleeps) == 1, 'Запросы должны проходить через лимит'
+    lines = output.getvalue().splitlines()
+    assert [line.split()[0] for line in lines] == [
+        '2020-09-13T13:00:00Z', '2020-09-13T15:00:00Z'
+    ], 'Переходы выводятся по порядку и только из заданного периода'
+
+
+def test_backfill_resumes_from_checkpoint(tmp_path, homework_item, clock):
+    checkpoint = backfill.Checkpoint(str(tmp_path / 'checkpoint.json'))
+    checkpoint.save('alice', SINCE, SINCE + 3600)
+    items = [
+        homework_item(1, 'approved', '2020-09-13T13:00:00Z'),
+        homework_item(2, 'approved', '2020-09-13T14:00:00Z'),
+    ]
+    runner, output, _ = make_backfill(tmp_path, clock)
+    calls = []
+    runner.run({'alice': make_fetch(items, calls)}, SINCE, SINCE + 7200)
+
+    assert calls == [SINCE + 3600]
+    assert output.getvalue().count('\n') == 1
+    assert 'hw2' in output.getvalue()
+    assert backfill.Checkpoint(
+        str(tmp_path / 'checkpoint.json')
+    ).positions == {}, 'Завершённый прогон не оставляет позицию'
+
+
+def test_backfill_ignores_checkpoint_of_other_run(tmp_path, clock):
+    checkpoint = backfill.Checkpoint(str(tmp_path / 'checkpoint.json'))
+    checkpoint.save('alice', SINCE - 86400, SINCE + 7200)
+    runner, _, _ = make_backfill(tmp_path, clock)
+    calls = []
+    runner.run({'alice': make_fetch([], calls)}, SINCE, SINCE + 3600)
+
+    assert calls == [SINCE], 'Новый прогон начинается с заданного since'
+
+
+def test_backfill_suppresses_delivered_transitions(tmp_path, homework_item,
+                                                   clock):
+    index = HomeworkIndex(statuses=homework.HOMEWORK_STATUSES)
+    delivered = homework_item(1, 'approved', '2020-09-13T13:00:00Z')
+    index.update(delivered)
+    runner, output, _ = make_backfill(tmp_path, clock, index)
+    runner.run(
+        {'alice': make_fetch([delivered], [])}, SINCE, SINCE + 3600
+    )
+
+    assert output.getvalue() == ''
+    assert runner.suppressed == 1
+
+
+def test_backfill_reports_failed_tenants(tmp_path, clock):
+    def broken(from_date):
+        raise homework.InvalidTokenError('rejected')
+
+    runner, _, _ = make_backfill(tmp_path, clock)
+    failed = runner.run(
+        {'alice': broken, 'bob': make_fetch([], [])}, SINCE, SINCE + 3600
+    )
+    assert failed == ['alice']
+
+
+def test_backfill_records_only_delivered_transitions(tmp_path, homework_item,
+                                                     clock):
+    index = HomeworkIndex(statuses=homework.HOMEWORK_STATUSES)
+    item = homework_item(1, 'approved', '2020-09-13T13:00:00Z')
+    runner, _, _ = make_backfill(tmp_path, clock, index)
+    runner.notifier = Notifier(delivered=False)
+    runner.run({'alice': make_fetch([item], [])}, SINCE, SINCE + 3600)
+    assert index.get(1) is None, 'Неотправленный переход не доставлен'
+
+    runner, _, _ = make_backfill(tmp_path, clock, index)
+    runner.notifier = notifier = Notifier(delivered=True)
+    runner.run({'alice': make_fetch([item], [])}, SINCE, SINCE + 3600)
+    assert len(notifier.messages) == 1
+    assert index.get(1)[1] == 'approved'
+
+
+def test_backfill_keeps_its_own_state_file(tmp_path, homework_item, clock):
+    bot_state = str(tmp_path / 'homework_state.idx')
+    own_state = str(tmp_path / 'backfill_state.idx')
+    bot_index = HomeworkIndex(statuses=homework.HOMEWORK_STATUSES)
+    bot_index.update(homework_item(1, 'approved', '2020-09-13T13:00:00Z'))
+    bot_index.snapshot(bot_state)
+    with open(bot_state, 'rb') as file:
+        saved = file.read()
+
+    index = backfill.load_state(own_state, seed=bot_state)
+    assert index.get(1)[1] == 'approved', 'Первый запуск копирует бота'
+    runner, _, _ = make_backfill(tmp_path, clock, index)
+    runner.state_file = own_state
+    runner.notifier = Notifier(delivered=True)
+    item = homework_item(2, 'rejected', '2020-09-13T13:00:00Z')
+    runner.run({'alice': make_fetch([item], [])}, SINCE, SINCE + 3600)
+
+    restored = backfill.load_state(own_state, seed=bot_state)
+    assert restored.get(2)[1] == 'rejected'
+    with open(bot_state, 'rb') as file:
+        assert file.read() == saved, 'Файл бота не должен переписываться'
+
+
+def test_backfill_refuses_state_file_of_bot():
+    with pytest.raises(SystemExit):
+        backfill.main(['0', '--state', homework.STATE_FILE])
@@ -0,0 +1,115 @@
+import os
+from http import HTTPStatus
+
+import pytest
+import requests
+from cryptography.fernet import Fernet
+
+import credentials
+import homework
+
+
+class MockResponse:
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def json(self):
+        return {'homeworks': [], 'current_date': 1600000000}
+
+
+@pytest.fixture
+def key():
+    return Fernet.generate_key()
+
+
+def write_tokens(path, tokens, key, mtime):
+    path.write_bytes(credentials.encrypt_tokens(tokens, key))
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_provider_caches_headers(tmp_path, key):
+    path = tmp_path / 'tokens.enc'
+    write_tokens(path, {'alice': 'a1', 'bob': 'b1'}, key, 1)
+    provider = credentials.CredentialProvider(str(path), key)
+
+    assert provider.tenants == ['alice', 'bob']
+    assert provider.headers('alice') == {'Authorization': 'OAuth a1'}
+    assert provider.headers('alice') is provider.headers('alice')
+    assert b'a1' not in path.read_bytes(), 'Токены должны храниться зашифрованными'
+
+
+def test_provider_rotates_tokens_without_restart(tmp_path, key):
+    path = tmp_path / 'tokens.enc'
+    write_tokens(path, {'alice': 'a1', 'bob': 'b1'}, key, 1)
+    provider = credentials.CredentialProvider(str(path), key)
+    bob_headers = provider.headers('bob')
+
+    assert not provider.refresh(), 'Неизменённый файл не нужно перечитывать'
+    write_tokens(path, {'alice': 'a2', 'bob': 'b1'}, key, 2)
+    assert provider.refresh()
+    assert provider.headers('alice') == {'Authorization': 'OAuth a2'}
+    assert provider.headers('bob') is bob_headers
+
+
+def test_provider_rejects_wrong_key(tmp_path, key):
+    path = tmp_path / 'tokens.enc'
+    write_tokens(path, {'alice': 'a1'}, key, 1)
+    with pytest.raises(ValueError):
+        credentials.CredentialProvider(str(path), Fernet.generate_key())
+
+
+def test_rejected_token_is_not_polled(monkeypatch, tmp_path, key):
+    path = tmp_path / 'tokens.enc'
+    write_tokens(path, {'alice': 'dead', 'bob': 'b1'}, key, 1)
+    provider = credentials.CredentialProvider(str(path), key)
+    calls = []
+
+    def mock_response_get(url, headers=None, params=None, **kwargs):
+        calls.append(headers['Authorization'])
+        if headers['Authorization'] == 'OAuth dead':
+            return MockResponse(HTTPStatus.UNAUTHORIZED)
+        return MockResponse(HTTPStatus.OK)
+
+    class Bot:
+        def send_message(self, chat_id, text):
+            pass
+
+    monkeypatch.setattr(requests, 'get', mock_response_get)
+    pollers = {}
+    homework.poll_tenants(Bot(), provider, pollers)
+    homework.poll_tenants(Bot(), provider, pollers)
+
+    assert calls == ['OAuth dead', 'OAuth b1', 'OAuth b1']
+    assert not provider.is_active('alice')
+
+    write_tokens(path, {'alice': 'a2', 'bob': 'b1'}, key, 2)
+    homework.poll_tenants(Bot(), provider, pollers)
+    assert provider.is_active('alice'), 'Заменённый токен снова опрашивается'
+    assert calls[-2:] == ['OAuth a2', 'OAuth b1']
+
+
+def test_credentials_file_requires_key(monkeypatch):
+    monkeypatch.setattr(homework, 'PRACTICUM_TOKEN', None)
+    monkeypatch.setattr(homework, 'TELEGRAM_TOKEN', '1234:abcdefg')
+    monkeypatch.setattr(homework, 'TELEGRAM_CHAT_ID', 12345)
+    monkeypatch.setattr(homework, 'CREDENTIALS_FILE', 'tokens.enc')
+    monkeypatch.setattr(homework, 'CREDENTIALS_KEY', None)
+    assert not homework.check_tokens()
+
+    monkeypatch.setattr(homework, 'CREDENTIALS_KEY', 'key')
+    assert homework.check_tokens()
+
+
+def test_main_exits_when_credentials_are_not_loaded(
+        monkeypatch, tmp_path, key):
+    path = tmp_path / 'tokens.enc'
+    write_tokens(path, {'alice': 'a1'}, key, 1)
+    monkeypatch.setattr(homework, 'check_tokens', lambda: True)
+    monkeypatch.setattr(homework, 'TELEGRAM_TOKEN', '1234:abcdefg')
+    monkeypatch.setattr(homework, 'CREDENTIALS_FILE', str(path))
+    monkeypatch.setattr(
+        homework, 'CREDENTIALS_KEY', Fernet.generate_key().decode()
+    )
+    with pytest.raises(SystemExit):
+        homework.main()
@@ -0,0 +1,102 @@
+import pytest
+
+import homework
+import simulation
+from cursor import Cursor, parse_moment
+
+
+def consume(cursor, response):
+    homeworks = cursor.fresh(response)
+    for item in homeworks:
+        cursor.mark(item)
+    cursor.advance(response)
+    return homeworks
+
+
+def test_cursor_advances_with_overlap():
+    cursor = Cursor(1000, overlap=60)
+    cursor.advance({'homeworks': [], 'current_date': 1600})
+    assert cursor.from_date == 1540, (
+        'Курсор должен сдвигаться к current_date минус окно перекрытия'
+    )
+
+
+def test_cursor_keeps_position_without_current_date():
+    cursor = Cursor(1000, overlap=60)
+    cursor.advance({'homeworks': []})
+    assert cursor.from_date == 1000
+
+
+def test_cursor_never_moves_back():
+    cursor = Cursor(1000, overlap=60)
+    cursor.advance({'homeworks': [], 'current_date': 1030})
+    assert cursor.from_date == 1000
+
+
+def test_cursor_skips_homeworks_from_overlap(homework_item):
+    cursor = Cursor(1600000000, overlap=600)
+    item = homework_item()
+    first = consume(
+        cursor, {'homeworks': [item], 'current_date': 1600000300}
+    )
+    second = consume(
+        cursor, {'homeworks': [dict(item)], 'current_date': 1600000600}
+    )
+    updated = homework_item(1, 'approved', '2020-09-13T12:35:00Z')
+    third = consume(
+        cursor, {'homeworks': [updated, item], 'current_date': 1600000900}
+    )
+
+    assert first == [item]
+    assert second == [], 'Работа из окна перекрытия не должна повторяться'
+    assert third == [updated]
+
+
+def test_cursor_forgets_homeworks_outside_window(homework_item):
+    cursor = Cursor(1600000000, overlap=60)
+    item = homework_item()
+    consume(cursor, {'homeworks': [item], 'current_date': 1600000100})
+    consume(cursor, {'homeworks': [], 'current_date': 1600010000})
+    assert not cursor.seen
+
+
+def test_cursor_returns_unmarked_homeworks_again(homework_item):
+    cursor = Cursor(1600000000, overlap=600)
+    item = homework_item()
+    response = {'homeworks': [item], 'current_date': 1600000300}
+    assert cursor.fresh(response) == [item]
+    cursor.advance(response)
+    assert cursor.fresh(response) == [item], (
+        'Работа, не отмеченная как обработанная, не должна теряться'
+    )
+
+
+@pytest.mark.parametrize('status, missing', [
+    ('on_hold', None),
+    ('approved', 'homework_name'),
+])
+def test_broken_homework_does_not_drop_others(homework_item, clock,
+                                              status, missing):
+    broken = homework_item(1, status, '2020-09-13T12:30:50Z')
+    broken.pop(missing, None)
+    bot = simulation.FakeBot(clock)
+    approved = homework_item(2, 'approved', '2020-09-13T12:31:00Z')
+    response = {'homeworks': [approved, broken], 'current_date': 1600000300}
+    poller = homework.HomeworkPoller(
+        bot, lambda timestamp: response, clock.time, fallback='error'
+    )
+    poller.poll()
+    poller.poll()
+
+    texts = [text for _, text in bot.messages]
+    assert homework.parse_status(approved) in texts, (
+        'Ошибка в одной работе не должна терять остальные'
+    )
+    assert len(texts) == 2, 'Каждое сообщение отправляется один раз'
+    assert texts[1].startswith('an error in the program')
+
+
+def test_parse_moment():
+    assert parse_moment('1600000000') == 1600000000
+    assert parse_moment('2020-09-13T12:26:40Z') == 1600000000
+    assert parse_moment('2020-09-13T12:26:40') == 1600000000
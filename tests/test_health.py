@@ -0,0 +1,82 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from health import Watchdog, start_server
+
+
+def test_watchdog_reports_stale_poll(clock):
+    watchdog = Watchdog(clock.time)
+    watchdog.expect('poll', 60)
+    watchdog.mark_ready()
+    assert watchdog.status()['healthy']
+
+    clock.sleep(61)
+    status = watchdog.status()
+    assert not status['healthy']
+    assert not status['ready']
+    assert status['problems'] == ['no poll for 61s']
+
+    watchdog.beat('poll')
+    assert watchdog.status()['healthy']
+
+
+def test_watchdog_checks_send_only_while_pending(clock):
+    watchdog = Watchdog(clock.time)
+    watchdog.expect('send', 60, after='send_attempt')
+    clock.sleep(600)
+    assert watchdog.status()['healthy'], (
+        'Без попыток отправки отсутствие отправок не является ошибкой'
+    )
+
+    watchdog.beat('send_attempt')
+    clock.sleep(61)
+    assert not watchdog.status()['healthy']
+    watchdog.beat('send')
+    assert watchdog.status()['healthy']
+
+
+def test_watchdog_detects_stuck_stage(clock):
+    metrics = {'send': {'depth': 3, 'processed': 5, 'errors': 0}}
+    watchdog = Watchdog(clock.time)
+    watchdog.watch_stages(lambda: metrics, 60)
+    watchdog.sample()
+    clock.sleep(30)
+    watchdog.sample()
+    assert watchdog.status()['healthy']
+
+    clock.sleep(31)
+    watchdog.sample()
+    assert watchdog.status()['problems'] == ['send stage is stuck for 61s']
+
+    metrics['send']['processed'] = 6
+    watchdog.sample()
+    assert watchdog.status()['healthy']
+
+
+def test_health_endpoints(clock):
+    watchdog = Watchdog(clock.time)
+    watchdog.expect('loop', 60)
+    server = start_server(watchdog, port=0, host='127.0.0.1')
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    try:
+        with urllib.request.urlopen(f'{url}/healthz') as response:
+            assert response.status == 200
+            assert json.load(response)['healthy']
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f'{url}/readyz')
+        assert error.value.code == 503, 'Бот ещё не готов к работе'
+
+        watchdog.mark_ready()
+        with urllib.request.urlopen(f'{url}/readyz') as response:
+            assert response.status == 200
+
+        clock.sleep(61)
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f'{url}/healthz')
+        assert error.value.code == 503
+    finally:
+        server.shutdown()
+        server.server_close()
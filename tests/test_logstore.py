@@ -0,0 +1,154 @@
+import gzip
+import logging
+import zlib
+
+import pytest
+
+import logstore
+
+
+@pytest.fixture
+def store(tmp_path):
+    handler = logstore.CompactLogHandler(
+        str(tmp_path), segment_bytes=600, block_records=4,
+        segments_kept=3
+    )
+    logger = logging.getLogger(f'test_logstore.{tmp_path.name}')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    yield logger, handler, str(tmp_path)
+    logger.removeHandler(handler)
+    handler.close()
+
+
+def make_record(logger, message, created, level=logging.DEBUG):
+    record = logger.makeRecord(logger.name, level, __file__, 0, message,
+                               (), None)
+    record.created = created
+    return record
+
+
+def test_repeated_lines_are_compacted(store):
+    logger, handler, directory = store
+    for second in range(100):
+        handler.handle(make_record(logger, 'go to sleep for 600s', second))
+    handler.handle(make_record(logger, 'main function is started', 100))
+    handler.flush()
+
+    records = list(logstore.query(directory))
+    assert [record['n'] for record in records] == [100, 1]
+    assert records[0]['t'] == 0 and records[0]['e'] == 99
+    assert logstore.format_record(records[0]).endswith(
+        'go to sleep for 600s (repeated 100 times until '
+        + logstore.time.strftime(
+            logstore.DATE_FORMAT, logstore.time.localtime(99)
+        ) + ')'
+    )
+
+
+def test_interleaved_cycle_lines_are_compacted(store):
+    logger, handler, directory = store
+    cycle = [
+        'get_api_answer function is started',
+        'check_response function is started',
+        'new homeworks are []',
+        'go to sleep for 600s',
+    ]
+    for number in range(8):
+        for offset, message in enumerate(cycle):
+            handler.handle(make_record(logger, message, number * 600 + offset))
+    handler.flush()
+
+    records = list(logstore.query(directory))
+    for message in cycle:
+        assert [record['n'] for record in records
+                if record['m'] == message] == [6, 2], (
+            'Строки циклов сворачиваются в пределах dedup_seconds'
+        )
+    assert len(records) == 2 * len(cycle)
+
+
+def test_segments_are_rotated_and_pruned(store):
+    logger, handler, directory = store
+    for second in range(400):
+        handler.handle(make_record(logger, f'line {second}', second))
+    handler.flush()
+
+    segments = logstore.list_segments(directory)
+    assert len(segments) == 3, 'Должны храниться только последние сегменты'
+    with gzip.open(segments[-1], 'rt') as file:
+        assert file.readline(), 'Сегмент должен читаться обычным gzip'
+
+
+def test_query_filters_and_reads_only_needed_blocks(store, monkeypatch):
+    logger, handler, directory = store
+    for second in range(40):
+        level = logging.ERROR if second == 30 else logging.DEBUG
+        handler.handle(make_record(logger, f'line {second}', second, level))
+    handler.flush()
+    decompressed = []
+    original = zlib.decompress
+
+    def counting_decompress(data, *args):
+        decompressed.append(len(data))
+        return original(data, *args)
+
+    monkeypatch.setattr(logstore.zlib, 'decompress', counting_decompress)
+
+    errors = list(logstore.query(directory, level=logging.ERROR))
+    assert [record['m'] for record in errors] == ['line 30']
+    assert len(decompressed) == 1, 'Читаться должен только блок с ошибкой'
+
+    decompressed.clear()
+    window = list(logstore.query(directory, since=10, until=13))
+    assert [record['m'] for record in window] == [
+        'line 10', 'line 11', 'line 12', 'line 13'
+    ]
+    assert len(decompressed) <= 2
+
+    assert [record['m'] for record in logstore.query(
+        directory, text='line 2'
+    )] == ['line 2'] + [f'line {second}' for second in range(20, 30)]
+
+
+def test_info_records_reach_disk_without_flush(store):
+    logger, handler, directory = store
+    for second in range(5):
+        handler.handle(make_record(logger, f'debug {second}', second))
+    handler.handle(
+        make_record(logger, 'Bot just sent a message', 5, logging.INFO)
+    )
+
+    assert [record['m'] for record in logstore.query(directory)] == [
+        f'debug {second}' for second in range(5)
+    ] + ['Bot just sent a message'], (
+        'Запись INFO не должна ждать заполнения блока в памяти'
+    )
+
+
+def test_exception_traceback_is_stored(store):
+    logger, handler, directory = store
+    try:
+        raise ValueError('broken response')
+    except ValueError:
+        logger.exception('an error in the program')
+
+    record, = logstore.query(directory)
+    assert record['m'] == 'an error in the program'
+    assert 'ValueError: broken response' in record['x']
+    assert 'Traceback' in logstore.format_record(record)
+
+
+def test_main_filters_by_level_name(store, capsys):
+    logger, handler, directory = store
+    handler.handle(make_record(logger, 'quiet', 0))
+    handler.handle(make_record(logger, 'loud', 1, logging.ERROR))
+
+    logstore.main(['--dir', directory, '--level', 'error'])
+    output = capsys.readouterr().out
+    assert 'loud' in output and 'quiet' not in output
+
+    with pytest.raises(SystemExit):
+        logstore.main(['--dir', directory, '--level', 'FOO'])
+    assert 'invalid choice' in capsys.readouterr().err
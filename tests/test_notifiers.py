@@ -0,0 +1,191 @@
+import logging
+import smtplib
+import threading
+import time
+
+import pytest
+from telegram import TelegramError
+
+import homework
+import notifiers
+from exceptions import SendMessageError
+from health import Watchdog
+from pipeline import Pipeline
+
+
+class RecordingTransport(notifiers.Transport):
+
+    def __init__(self, name, max_batch=1, delay=0, failures=0):
+        self.name = name
+        self.max_batch = max_batch
+        self.delay = delay
+        self.failures = failures
+        self.batches = []
+
+    def send_batch(self, messages):
+        time.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise SendMessageError('unavailable')
+        self.batches.append(list(messages))
+
+
+def test_transports_are_called_in_parallel():
+    slow = [RecordingTransport(f'slow{number}', delay=0.2)
+            for number in range(3)]
+    notifier = notifiers.Notifier(slow)
+    started = time.perf_counter()
+    assert all(notifier.deliver(['message']).values())
+    elapsed = time.perf_counter() - started
+    notifier.close()
+
+    assert elapsed < 0.5, 'Каналы должны отправлять параллельно'
+    assert all(transport.batches == [['message']] for transport in slow)
+
+
+def test_failing_transport_does_not_affect_others():
+    sleeps = []
+    broken = RecordingTransport('broken', failures=10)
+    healthy = RecordingTransport('healthy')
+    notifier = notifiers.Notifier(
+        [broken, healthy], retries=3, backoff=1, sleep=sleeps.append
+    )
+
+    assert notifier.deliver(['first', 'second']) == {
+        'broken': False, 'healthy': True
+    }
+    notifier.close()
+    assert healthy.batches == [['first'], ['second']]
+    assert broken.batches == []
+    assert sorted(sleeps) == [1, 1, 2, 2]
+
+
+def test_transport_recovers_after_retry():
+    sleeps = []
+    flaky = RecordingTransport('flaky', failures=1)
+    notifier = notifiers.Notifier([flaky], sleep=sleeps.append)
+    assert notifier.deliver(['message']) == {'flaky': True}
+    assert flaky.batches == [['message']]
+    assert sleeps == [notifiers.TRANSPORT_BACKOFF]
+
+
+def test_messages_are_batched_by_transport_limit():
+    batched = RecordingTransport('batched', max_batch=20)
+    notifier = notifiers.Notifier([batched])
+    notifier.deliver([f'message {number}' for number in range(25)])
+    assert [len(batch) for batch in batched.batches] == [20, 5]
+
+
+def test_telegram_errors_become_send_message_errors():
+    class BrokenBot:
+        def send_message(self, chat_id, text):
+            raise TelegramError('blocked')
+
+    transport = notifiers.TelegramTransport(BrokenBot(), 12345)
+    with pytest.raises(SendMessageError):
+        transport.send_batch(['message'])
+
+
+def test_webhook_posts_one_request_per_batch(monkeypatch):
+    calls = []
+
+    class Response:
+        status_code = 200
+
+    transport = notifiers.WebhookTransport('https://hooks.example/abc')
+    monkeypatch.setattr(
+        transport.session, 'post',
+        lambda url, json=None, timeout=None: calls.append(json) or Response()
+    )
+    transport.send_batch(['first', 'second'])
+    assert calls == [{'text': 'first\n\nsecond'}]
+
+
+def test_email_reuses_relay_connection(monkeypatch):
+    connections = []
+
+    class FakeSMTP:
+        def __init__(self, host, port, timeout=None):
+            self.sent = []
+            self.closed = False
+            connections.append(self)
+
+        def send_message(self, letter):
+            if self.closed:
+                raise smtplib.SMTPServerDisconnected()
+            self.sent.append(letter.get_content())
+
+        def quit(self):
+            pass
+
+    monkeypatch.setattr(notifiers.smtplib, 'SMTP', FakeSMTP)
+    transport = notifiers.EmailTransport(
+        'localhost', 25, 'bot@localhost', 'student@localhost'
+    )
+    transport.send_batch(['first'])
+    transport.send_batch(['second', 'third'])
+    assert len(connections) == 1
+    assert connections[0].sent == ['first\n', 'second\n\nthird\n']
+
+    connections[0].closed = True
+    with pytest.raises(SendMessageError):
+        transport.send_batch(['lost'])
+    transport.send_batch(['fourth'])
+    assert len(connections) == 2
+
+
+def test_single_transport_runs_in_caller_thread():
+    threads = []
+
+    class ThreadTransport(notifiers.Transport):
+        def send_batch(self, messages):
+            threads.append(threading.current_thread())
+
+    notifiers.Notifier([ThreadTransport()]).deliver(['message'])
+    assert threads == [threading.current_thread()]
+
+
+def test_failing_secondary_transport_keeps_send_healthy(clock):
+    watchdog = Watchdog(clock.time)
+    watchdog.expect('send', 1800, after='send_attempt')
+    notifier = notifiers.Notifier(
+        [RecordingTransport('telegram'),
+         RecordingTransport('webhook', failures=10)],
+        retries=1
+    )
+    poller = homework.HomeworkPoller(
+        notifier,
+        lambda timestamp: {'homeworks': []},
+        clock.time
+    )
+    pipeline = Pipeline(watchdog=watchdog)
+    pipeline.send_handler((poller, ['first']))
+    clock.sleep(1806)
+    pipeline.send_handler((poller, ['second']))
+    notifier.close()
+
+    assert watchdog.status()['healthy'], (
+        'Сбой дополнительного канала не должен ронять /healthz'
+    )
+
+
+def test_poller_logs_only_delivered_messages(caplog):
+    notifier = notifiers.Notifier(
+        [RecordingTransport('telegram', failures=10)], retries=1
+    )
+    poller = homework.HomeworkPoller(
+        notifier, lambda timestamp: {'homeworks': []}, lambda: 1000
+    )
+    with caplog.at_level(logging.INFO, logger='homework'):
+        assert not poller.deliver(['message'])
+
+    assert 'Bot just sent a message' not in caplog.text
+    assert "Can't send a message: message" in caplog.text
+
+
+def test_transport_requires_send_batch():
+    class Incomplete(notifiers.Transport):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,132 @@
+import threading
+
+import pytest
+
+from pipeline import Pipeline
+
+
+class FakePoller:
+
+    def __init__(self, name, gate=None):
+        self.name = name
+        self.gate = gate
+        self.delivered = []
+
+    def request(self):
+        return {'name': self.name}, None
+
+    def process(self, response, error=None):
+        return [f'{response["name"]} message']
+
+    def deliver(self, messages):
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        self.delivered.extend(messages)
+
+
+def test_pipeline_delivers_messages():
+    pipeline = Pipeline()
+    pipeline.start()
+    pollers = [FakePoller(f'p{index}') for index in range(20)]
+    for poller in pollers:
+        assert pipeline.submit(poller)
+    assert pipeline.wait(timeout=5)
+    pipeline.stop()
+
+    for poller in pollers:
+        assert poller.delivered == [f'{poller.name} message']
+    metrics = pipeline.metrics()
+    assert metrics['send']['processed'] == 20
+    assert metrics['in_flight'] == 0
+
+
+def test_slow_send_does_not_block_other_pollers():
+    gate = threading.Event()
+    pipeline = Pipeline(workers={'send': 2})
+    pipeline.start()
+    slow = FakePoller('slow', gate)
+    fast = FakePoller('fast')
+    pipeline.submit(slow)
+    pipeline.submit(fast)
+    for _ in range(100):
+        if fast.delivered:
+            break
+        threading.Event().wait(0.01)
+
+    assert fast.delivered == ['fast message'], (
+        'Медленная отправка не должна задерживать другие подписки'
+    )
+    assert not pipeline.submit(slow), 'Подписка в работе не ставится повторно'
+    gate.set()
+    assert pipeline.wait(timeout=5)
+    pipeline.stop()
+    assert slow.delivered == ['slow message']
+
+
+def test_overload_skips_polls_instead_of_blocking():
+    gate = threading.Event()
+    pipeline = Pipeline(
+        workers={'fetch': 1, 'decode': 1, 'send': 1}, maxsize=1
+    )
+    pipeline.start()
+    pollers = [FakePoller(f'p{index}', gate) for index in range(10)]
+    accepted = [pipeline.submit(poller) for poller in pollers]
+
+    assert not all(accepted)
+    assert pipeline.metrics()['skipped'] == accepted.count(False)
+    gate.set()
+    assert pipeline.wait(timeout=5)
+    pipeline.stop()
+    for poller, was_accepted in zip(pollers, accepted):
+        assert bool(poller.delivered) == was_accepted
+
+
+def test_failed_stage_releases_poller():
+    class BrokenPoller(FakePoller):
+        def process(self, response, error=None):
+            raise ValueError('broken')
+
+    pipeline = Pipeline()
+    pipeline.start()
+    poller = BrokenPoller('broken')
+    pipeline.submit(poller)
+    assert pipeline.wait(timeout=5)
+    pipeline.stop()
+    assert pipeline.metrics()['decode']['errors'] == 1
+    assert poller.delivered == []
+
+
+def test_main_saves_state_after_pipeline_drains(monkeypatch, tmp_path):
+    import homework
+    import simulation
+
+    class StopLoop(Exception):
+        pass
+
+    clock = simulation.SimulatedClock(1600000000)
+    events = [(1600000000, 'hw0', 'approved')]
+    api = simulation.FakeAPI(clock, events)
+    bot = simulation.FakeBot(clock)
+    saved = []
+
+    def sleep(seconds):
+        raise StopLoop
+
+    monkeypatch.setattr(homework, 'Bot', lambda token, **kwargs: bot)
+    monkeypatch.setattr(homework, 'check_tokens', lambda: True)
+    monkeypatch.setattr(homework, 'PRACTICUM_TOKEN', 'token')
+    monkeypatch.setattr(homework, 'STATE_FILE', str(tmp_path / 'state.idx'))
+    monkeypatch.setattr(
+        homework, 'PENDING_FILE', str(tmp_path / 'pending.json')
+    )
+    monkeypatch.setattr(
+        homework, 'request_api', lambda timestamp, headers: api(timestamp)
+    )
+    monkeypatch.setattr(
+        homework, 'save_index',
+        lambda index, path: saved.append(len(index))
+    )
+    with pytest.raises(StopLoop):
+        homework.main(clock=clock.time, sleep=sleep)
+
+    assert saved == [1], 'Состояние сохраняется после обработки опроса'
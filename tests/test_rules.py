@@ -0,0 +1,203 @@
+import json
+
+import pytest
+
+import homework
+import simulation
+from state_index import HomeworkIndex
+from rules import ESCALATE, HOLD, NOTIFY, SKIP, RuleEngine, RuleSet
+
+NOON_UTC = 1600000000 - 1600000000 % 86400 + 12 * 3600
+
+
+def test_first_matching_rule_wins(homework_item):
+    rules = RuleSet([
+        {'statuses': ['approved', 'rejected'], 'action': NOTIFY},
+        {'action': SKIP},
+    ])
+    assert rules.evaluate(homework_item(1, 'approved'), NOON_UTC) == NOTIFY
+    assert rules.evaluate(homework_item(1, 'reviewing'), NOON_UTC) == SKIP
+    assert rules.evaluate(homework_item(1, 'unknown'), NOON_UTC) == SKIP
+
+
+def test_without_rules_everything_is_notified(homework_item):
+    rules = RuleSet()
+    assert rules.evaluate(homework_item(1, 'reviewing'), NOON_UTC) == NOTIFY
+
+
+def test_quiet_hours_use_utc_offset(homework_item):
+    rules = RuleSet([{'quiet_hours': [23, 7], 'action': SKIP}], utc_offset=3)
+    assert rules.evaluate(homework_item(1, 'approved'), NOON_UTC) == NOTIFY
+    assert rules.evaluate(
+        homework_item(1, 'approved'), NOON_UTC + 9 * 3600
+    ) == SKIP, 'В 00:00 по UTC+3 уведомления должны молчать'
+
+
+def test_engine_reads_rules_per_chat(tmp_path, homework_item):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({
+        'fallback': 'skip',
+        'chats': {
+            'default': [{'action': SKIP}],
+            '12345': [{'statuses': ['approved'], 'action': ESCALATE}],
+        },
+    }))
+    engine = RuleEngine.from_file(str(path))
+
+    assert engine.fallback == 'skip'
+    assert engine.for_chat(12345).evaluate(
+        homework_item(1, 'approved'), NOON_UTC
+    ) == ESCALATE
+    assert engine.for_chat(777).evaluate(
+        homework_item(1, 'approved'), NOON_UTC
+    ) == SKIP
+
+
+def test_engine_rejects_unknown_actions():
+    with pytest.raises(ValueError):
+        RuleEngine({'default': [{'action': 'shout'}]})
+
+
+@pytest.mark.parametrize('fallback, expected', [
+    ('notify', 1),
+    ('skip', 0),
+    ('error', 0),
+])
+def test_poller_fallback_for_unknown_status(fallback, expected,
+                                            homework_item):
+    clock = simulation.SimulatedClock(NOON_UTC)
+    bot = simulation.FakeBot(clock)
+    response = {
+        'homeworks': [homework_item(1, 'on_hold')],
+        'current_date': NOON_UTC,
+    }
+    poller = homework.HomeworkPoller(
+        bot, lambda timestamp: response, clock.time, fallback=fallback
+    )
+    poller.poll()
+
+    sent = [text for _, text in bot.messages
+            if text.startswith(simulation.STATUS_MESSAGE_PREFIX)]
+    assert len(sent) == expected
+    if fallback == 'error':
+        assert bot.messages[0][1].startswith('an error in the program')
+
+
+def test_poller_escalates_long_review(homework_item, clock):
+    bot = simulation.FakeBot(clock)
+    rules = RuleSet([
+        {'statuses': ['reviewing'], 'older_than': 48 * 3600,
+         'action': ESCALATE},
+    ])
+    item = homework_item(1, 'reviewing', date_updated='2020-09-13T12:30:00Z')
+    responses = iter([{'homeworks': [item], 'current_date': 1600000300}])
+
+    def fetch(timestamp):
+        return next(
+            responses,
+            {'homeworks': [], 'current_date': int(clock.time())}
+        )
+
+    poller = homework.HomeworkPoller(bot, fetch, clock.time, rules=rules)
+    poller.poll()
+    clock.sleep(47 * 3600)
+    poller.poll()
+    assert len(bot.messages) == 1
+    clock.sleep(2 * 3600)
+    poller.poll()
+    poller.poll()
+
+    assert len(bot.messages) == 2, 'Напоминание должно прийти один раз'
+    assert 'не меняется 48 ч' in bot.messages[1][1]
+
+
+def test_timer_rule_escalates_by_default(homework_item, clock):
+    bot = simulation.FakeBot(clock)
+    rules = RuleSet([{'statuses': ['reviewing'], 'older_than': 48 * 3600}])
+    item = homework_item(1, 'reviewing', date_updated='2020-09-13T12:30:00Z')
+
+    def fetch(timestamp):
+        return {'homeworks': [], 'current_date': int(clock.time())}
+
+    poller = homework.HomeworkPoller(
+        bot, lambda timestamp: {'homeworks': [item],
+                                'current_date': 1600000300},
+        clock.time, rules=rules
+    )
+    poller.poll()
+    poller.fetch = fetch
+    clock.sleep(49 * 3600)
+    poller.poll()
+
+    assert len(bot.messages) == 2
+    assert bot.messages[1][1].startswith('Важно!')
+    assert poller.pending()['watched'] == [], (
+        'После напоминания работа не должна ждать вечно'
+    )
+
+
+@pytest.mark.parametrize('action', [HOLD, SKIP])
+def test_timer_rule_rejects_hold_and_skip(action):
+    with pytest.raises(ValueError):
+        RuleSet([{'older_than': 3600, 'action': action}])
+
+
+def test_quiet_hours_hold_messages_until_morning(homework_item):
+    midnight = NOON_UTC + 12 * 3600
+    clock = simulation.SimulatedClock(midnight)
+    bot = simulation.FakeBot(clock)
+    rules = RuleSet([{'quiet_hours': [23, 7]}])
+    item = homework_item(1, 'approved', date_updated='2020-09-14T00:00:00Z')
+    responses = iter([{'homeworks': [item], 'current_date': midnight}])
+
+    def fetch(timestamp):
+        return next(
+            responses,
+            {'homeworks': [], 'current_date': int(clock.time())}
+        )
+
+    poller = homework.HomeworkPoller(
+        bot, fetch, clock.time, index=HomeworkIndex(), rules=rules
+    )
+    assert rules.evaluate(item, midnight) == HOLD
+    poller.poll()
+    clock.sleep(6 * 3600)
+    poller.poll()
+    assert bot.messages == [], 'Ночью уведомление должно ждать'
+
+    clock.sleep(3600)
+    poller.poll()
+    poller.poll()
+    assert [text for _, text in bot.messages] == [
+        homework.parse_status(item)
+    ], 'Утром отложенное уведомление отправляется один раз'
+
+
+def test_pending_escalation_survives_restart(tmp_path, homework_item,
+                                            clock):
+    bot = simulation.FakeBot(clock)
+    rules = RuleSet([
+        {'statuses': ['reviewing'], 'older_than': 48 * 3600,
+         'action': ESCALATE},
+    ])
+    item = homework_item(1, 'reviewing', date_updated='2020-09-13T12:30:00Z')
+
+    def fetch(timestamp):
+        return {'homeworks': [], 'current_date': int(clock.time())}
+
+    first = homework.HomeworkPoller(
+        bot, lambda timestamp: {'homeworks': [item],
+                                'current_date': 1600000300},
+        clock.time, rules=rules
+    )
+    first.poll()
+    path = str(tmp_path / 'pending.json')
+    homework.save_pending({'alice': first}, path)
+
+    restarted = homework.HomeworkPoller(bot, fetch, clock.time, rules=rules)
+    restarted.restore(homework.load_pending(path)['alice'])
+    clock.sleep(49 * 3600)
+    restarted.poll()
+
+    assert len(bot.messages) == 2
+    assert 'не меняется 48 ч' in bot.messages[1][1]
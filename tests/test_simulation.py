@@ -0,0 +1,100 @@
+import pytest
+
+import homework
+import simulation
+
+
+class StopLoop(Exception):
+    pass
+
+
+class InlinePipeline:
+
+    def __init__(self, watchdog=None):
+        pass
+
+    def start(self):
+        pass
+
+    def submit(self, poller):
+        poller.poll()
+
+    def wait(self, timeout=None):
+        return True
+
+    def metrics(self):
+        return {}
+
+
+def test_simulated_clock_does_not_block():
+    clock = simulation.SimulatedClock(start=100)
+    clock.sleep(homework.RETRY_TIME)
+    assert clock.time() == 100 + homework.RETRY_TIME, (
+        'sleep() симулированных часов должен сдвигать время'
+    )
+
+
+def test_main_uses_injected_clock_and_sleep(monkeypatch, tmp_path):
+    clock = simulation.SimulatedClock(start=1600000000)
+    events = [(1600000300, 'hw0', 'reviewing')]
+    api = simulation.FakeAPI(clock, events)
+    bot = simulation.FakeBot(clock)
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 3:
+            raise StopLoop
+        clock.sleep(seconds)
+
+    monkeypatch.setattr(homework, 'Bot', lambda token, **kwargs: bot)
+    monkeypatch.setattr(homework, 'check_tokens', lambda: True)
+    monkeypatch.setattr(homework, 'PRACTICUM_TOKEN', 'token')
+    monkeypatch.setattr(homework, 'Pipeline', InlinePipeline)
+    monkeypatch.setattr(homework, 'STATE_FILE', str(tmp_path / 'state.idx'))
+    monkeypatch.setattr(
+        homework, 'PENDING_FILE', str(tmp_path / 'pending.json')
+    )
+    monkeypatch.setattr(
+        homework, 'request_api', lambda timestamp, headers: api(timestamp)
+    )
+    with pytest.raises(StopLoop):
+        homework.main(clock=clock.time, sleep=sleep)
+
+    assert sleeps == [homework.RETRY_TIME] * 3
+    assert api.from_dates[0] == 1600000000
+    sent = [text for _, text in bot.messages
+            if text.startswith(simulation.STATUS_MESSAGE_PREFIX)]
+    assert sent == simulation.expected_messages(events)
+    assert (tmp_path / 'state.idx').exists(), 'Состояние работ не сохранено'
+    assert (tmp_path / 'pending.json').exists()
+
+
+def test_simulation_delivers_every_transition_once():
+    report = simulation.run_simulation(subscriptions=200, days=2, seed=1)
+
+    assert report.polls == 200 * 2 * simulation.DAY // homework.RETRY_TIME
+    assert report.sent > 0
+    assert not report.missed, 'Бот пропустил изменения статуса'
+    assert not report.duplicates, 'Бот отправил повторные уведомления'
+    assert not report.cursor_stalls, 'from_date не сдвигается к current_date'
+
+
+def test_simulation_is_deterministic():
+    first = simulation.run_simulation(subscriptions=50, days=1, seed=7)
+    second = simulation.run_simulation(subscriptions=50, days=1, seed=7)
+
+    assert (first.polls, first.sent, first.errors) == (
+        second.polls, second.sent, second.errors
+    )
+
+
+def test_simulation_with_shared_index():
+    report = simulation.run_simulation(
+        subscriptions=200, days=2, seed=3, use_index=True
+    )
+
+    assert report.sent > 0
+    assert not report.missed, 'Бот пропустил изменения статуса'
+    assert not report.duplicates, 'Бот отправил повторные уведомления'
+    assert not report.cursor_stalls, 'from_date не сдвигается к current_date'
@@ -0,0 +1,177 @@
+import threading
+import time
+
+from telegram import TelegramError
+
+import homework
+import notifiers
+from state_index import HomeworkIndex
+
+
+def test_index_reports_status_changes(homework_item):
+    index = HomeworkIndex(statuses=homework.HOMEWORK_STATUSES)
+
+    assert index.update(homework_item(1))
+    assert not index.update(homework_item(1)), (
+        'Повторный статус не должен считаться изменением'
+    )
+    assert index.update(homework_item(1, 'approved'))
+    assert index.get(1) == ('hw1', 'approved', 1600000200)
+    assert index.get(2) is None
+    assert len(index) == 1
+
+
+def test_index_codes_follow_homework_statuses():
+    index = HomeworkIndex(statuses=homework.HOMEWORK_STATUSES)
+    for code, status in enumerate(homework.HOMEWORK_STATUSES):
+        assert index.status_code(status) == code
+    assert index.status_code('unknown') == len(homework.HOMEWORK_STATUSES)
+
+
+def test_index_interns_names(homework_item):
+    index = HomeworkIndex()
+    for homework_id in range(1, 101):
+        index.update(homework_item(homework_id, name='hw_bot.zip'))
+    assert len(index.name_table) == 1
+
+
+def test_index_snapshot_restores_state(tmp_path, homework_item):
+    index = HomeworkIndex(capacity=4, statuses=homework.HOMEWORK_STATUSES)
+    for homework_id in range(1, 1001):
+        index.update(homework_item(homework_id, 'rejected'))
+    path = str(tmp_path / 'state.idx')
+    index.snapshot(path)
+    assert not index.dirty
+
+    restored = HomeworkIndex.restore(path)
+    assert len(restored) == 1000
+    for homework_id in (1, 500, 1000):
+        assert restored.get(homework_id) == index.get(homework_id)
+    assert not restored.update(homework_item(1, 'rejected'))
+    assert restored.update(homework_item(1001))
+
+
+def test_index_interns_statuses_under_lock(homework_item):
+    index = HomeworkIndex(capacity=8)
+    statuses = [f'status{number}' for number in range(200)]
+    barrier = threading.Barrier(8)
+
+    def update(worker):
+        barrier.wait()
+        for number, status in enumerate(statuses):
+            index.update(homework_item(worker * 1000 + number, status))
+
+    threads = [threading.Thread(target=update, args=(worker,))
+               for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(index.status_table) == len(statuses)
+    for worker in range(8):
+        for number, status in enumerate(statuses):
+            assert index.get(worker * 1000 + number)[1] == status
+
+
+def test_index_reads_stored_homework_while_growing(homework_item):
+    index = HomeworkIndex(capacity=8)
+    stored = homework_item(1, 'reviewing')
+    index.update(stored)
+    done = threading.Event()
+    misses = []
+
+    def read():
+        while not done.is_set():
+            if index.changed(stored) or 1 not in index:
+                misses.append(len(index))
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        for homework_id in range(2, 30000):
+            index.update(homework_item(homework_id, 'approved'))
+    finally:
+        done.set()
+        reader.join()
+
+    assert misses == [], 'Чтение во время grow() не должно терять работы'
+
+
+def test_index_stays_under_100_bytes_per_homework(homework_item):
+    index = HomeworkIndex(statuses=homework.HOMEWORK_STATUSES)
+    statuses = list(homework.HOMEWORK_STATUSES)
+    total = 100000
+    for homework_id in range(1, total + 1):
+        index.update(homework_item(
+            homework_id, statuses[homework_id % 3],
+            name=f'student{homework_id}__hw05_final.zip'
+        ))
+    assert index.nbytes / total < 100, (
+        f'Индекс занимает {index.nbytes / total:.1f} байт на работу'
+    )
+
+
+def test_poller_records_transition_only_after_delivery(clock, homework_item):
+    class FlakyBot:
+        def __init__(self):
+            self.failures = 1
+            self.messages = []
+
+        def send_message(self, chat_id, text):
+            if self.failures:
+                self.failures -= 1
+                raise TelegramError('unavailable')
+            self.messages.append(text)
+
+    bot = FlakyBot()
+    index = HomeworkIndex(statuses=homework.HOMEWORK_STATUSES)
+    item = homework_item(1, 'approved', '2020-09-13T12:26:50Z')
+    responses = iter([{'homeworks': [item], 'current_date': 1600000010}])
+
+    def fetch(timestamp):
+        return next(
+            responses, {'homeworks': [], 'current_date': int(clock.time())}
+        )
+
+    poller = homework.HomeworkPoller(
+        notifiers.Notifier([notifiers.TelegramTransport(bot, 1)],
+                           retries=1),
+        fetch, clock.time, index
+    )
+    poller.poll()
+    assert index.get(1) is None, 'Недоставленный переход не записан'
+
+    clock.sleep(homework.RETRY_TIME)
+    poller.poll()
+    assert bot.messages == [homework.parse_status(item)]
+    assert index.get(1)[1] == 'approved'
+
+
+def test_index_spreads_ids_with_equal_low_bits(homework_item):
+    def fill(step):
+        index = HomeworkIndex(statuses=homework.HOMEWORK_STATUSES)
+        started = time.perf_counter()
+        for number in range(1, 20001):
+            index.update(homework_item(number * step))
+        return time.perf_counter() - started
+
+    assert fill(4096) < 3 * fill(1), (
+        'id с одинаковыми младшими битами не должны замедлять индекс'
+    )
+
+
+def test_index_restores_files_of_previous_version(tmp_path, homework_item):
+    index = HomeworkIndex(statuses=homework.HOMEWORK_STATUSES)
+    for homework_id in range(1, 101):
+        index.update(homework_item(homework_id, 'approved'))
+    path = tmp_path / 'state.idx'
+    index.snapshot(str(path))
+    data = bytearray(path.read_bytes())
+    data[4] = 1
+    path.write_bytes(bytes(data))
+
+    restored = HomeworkIndex.restore(str(path))
+    assert restored.dirty, 'Переложенный индекс нужно сохранить заново'
+    for homework_id in range(1, 101):
+        assert restored.get(homework_id) == index.get(homework_id)